@@ -1,4 +1,10 @@
-from typing import Dict, List, Any
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Tuple
+from paylines import CompiledPaytable
 
 class GameConfig:
     """Configuration class for 3x5 slot game."""
@@ -82,3 +88,101 @@ class GameConfig:
         self.wild_substitutes = True
         self.scatter_pays_any = True
         self.bonus_trigger_count = 3
+    
+    def compile(self) -> "CompiledGameConfig":
+        """Freeze this configuration into the compiled form used on the hot path."""
+        symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        kinds = self.reels + 1
+        
+        pay_array = [0.0] * (len(self.symbols) * kinds)
+        for symbol, pays in self.paytable.items():
+            for count, payout in pays.items():
+                pay_array[symbol_ids[symbol] * kinds + count] = payout
+        
+        definition = {
+            "reels": self.reels,
+            "rows": self.rows,
+            "symbols": self.symbols,
+            "paytable": {symbol: {str(count): payout for count, payout in pays.items()} for symbol, pays in self.paytable.items()},
+            "paylines": self.paylines,
+            "reel_strips": self.reel_strips,
+            "target_rtp": self.target_rtp,
+            "min_bet": self.min_bet,
+            "max_bet": self.max_bet,
+            "max_win_multiplier": self.max_win_multiplier,
+            "wild_substitutes": self.wild_substitutes,
+            "scatter_pays_any": self.scatter_pays_any,
+            "bonus_trigger_count": self.bonus_trigger_count
+        }
+        content_hash = hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+        
+        return CompiledGameConfig(
+            reels=self.reels,
+            rows=self.rows,
+            total_positions=self.total_positions,
+            symbols=tuple(self.symbols),
+            symbol_ids=MappingProxyType(symbol_ids),
+            paytable=MappingProxyType({symbol: MappingProxyType(dict(pays)) for symbol, pays in self.paytable.items()}),
+            pay_array=tuple(pay_array),
+            paylines=tuple(tuple(payline) for payline in self.paylines),
+            payline_table=CompiledPaytable(self.paytable, self.reels, self.symbols),
+            reel_strips=tuple(tuple(strip) for strip in self.reel_strips),
+            reel_strip_ids=tuple(tuple(symbol_ids[symbol] for symbol in strip) for strip in self.reel_strips),
+            stop_counts=tuple(len(strip) - self.rows + 1 for strip in self.reel_strips),
+            target_rtp=self.target_rtp,
+            min_bet=self.min_bet,
+            max_bet=self.max_bet,
+            max_win_multiplier=self.max_win_multiplier,
+            wild_substitutes=self.wild_substitutes,
+            scatter_pays_any=self.scatter_pays_any,
+            bonus_trigger_count=self.bonus_trigger_count,
+            content_hash=content_hash
+        )
+
+@dataclass(frozen=True, eq=False)
+class CompiledGameConfig:
+    """
+    Immutable, precompiled game configuration shared across requests.
+    
+    Exposes the same attribute names as GameConfig (with tuples and
+    read-only mappings) plus integer-encoded forms for the hot path:
+    symbol ids, encoded reel strips, the number of reachable stops per reel,
+    a flattened paytable indexed by symbol_id * (reels + 1) + count, the
+    compiled payline table and a content hash of the definition.
+    
+    Configs compare and hash by content hash, so two compiles of the same
+    definition are equal and share cache entries.
+    """
+    reels: int
+    rows: int
+    total_positions: int
+    symbols: Tuple[str, ...]
+    symbol_ids: Mapping[str, int]
+    paytable: Mapping[str, Mapping[int, float]]
+    pay_array: Tuple[float, ...]
+    paylines: Tuple[Tuple[int, ...], ...]
+    payline_table: CompiledPaytable
+    reel_strips: Tuple[Tuple[str, ...], ...]
+    reel_strip_ids: Tuple[Tuple[int, ...], ...]
+    stop_counts: Tuple[int, ...]
+    target_rtp: float
+    min_bet: float
+    max_bet: float
+    max_win_multiplier: float
+    wild_substitutes: bool
+    scatter_pays_any: bool
+    bonus_trigger_count: int
+    content_hash: str
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CompiledGameConfig):
+            return NotImplemented
+        return self.content_hash == other.content_hash
+    
+    def __hash__(self) -> int:
+        return hash(self.content_hash)
+
+@lru_cache(maxsize=None)
+def load_config() -> CompiledGameConfig:
+    """Compiled default configuration, built once per process."""
+    return GameConfig().compile()
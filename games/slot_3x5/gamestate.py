@@ -1,97 +1,195 @@
 import random
 import json
 from typing import Dict, List, Any
-from game_config import GameConfig
+from game_config import CompiledGameConfig, load_config
 from paylines import check_paylines
+import instrumentation
+import spin_rng
+from spin_rng import CounterRNG
 
-def run_spin(config: GameConfig) -> Dict[str, Any]:
-    """
-    Main game logic function required by Stake Engine.
-    Generates a single spin result with all events.
+class SpinResult:
     """
+    Outcome of one spin: the board, its winning lines and the total multiplier.
     
-    # Generate random board
-    board = generate_board(config)
-    
-    # Check for wins
-    wins = check_paylines(board, config.paylines, config.paytable)
+    Stake Engine events are only built by `to_dict`, which applies the bet
+    as it goes, so code that just needs payouts never allocates them.
+    """
+    __slots__ = ("id", "board", "wins", "payout_multiplier")
     
-    # Calculate total win
-    total_win = sum(win['payout'] for win in wins)
+    # Base game only; there are no bonus rounds yet
+    criteria = "basegame"
     
-    # Generate events for Stake Engine
-    events = []
+    def __init__(self, sim_id: int, board: List[str], wins: List[Dict[str, Any]]):
+        self.id = sim_id
+        self.board = board
+        self.wins = wins
+        self.payout_multiplier = sum(win['payout'] for win in wins)
     
-    # Reveal event - shows the board symbols
-    events.append({
-        "index": 0,
-        "type": "reveal",
-        "board": board,
-        "paddingPositions": [],
-        "gameType": "basegame",
-        "anticipation": []
-    })
+    def __repr__(self) -> str:
+        return f"SpinResult(id={self.id}, payout_multiplier={self.payout_multiplier}, wins={len(self.wins)})"
     
-    # Win info event - if there are wins
-    if wins:
-        win_info = {
-            "index": 1,
-            "type": "winInfo",
-            "totalWin": total_win,
-            "wins": [
-                {
-                    "symbol": win['symbol'],
-                    "kind": win['count'],
-                    "win": win['payout'],
-                    "positions": win['positions'],
-                    "meta": {}
-                } for win in wins
-            ]
-        }
-        events.append(win_info)
+    def to_dict(self, bet_amount: float = None) -> Dict[str, Any]:
+        """
+        Stake Engine result with all events.
         
-        # Set win event
-        events.append({
-            "index": 2,
-            "type": "setWin",
-            "amount": total_win,
-            "winLevel": get_win_level(total_win)
-        })
+        Args:
+            bet_amount: Scale every amount by this bet, with baseGameWins the
+                scaled win (`scale_result` semantics); when omitted, the
+                unit-bet books format with baseGameWins normalised by 100
         
-        # Total win event
-        events.append({
-            "index": 3,
-            "type": "setTotalWin",
-            "amount": total_win
-        })
+        Returns:
+            Game result with all events
+        """
+        if bet_amount is None:
+            total_win = self.payout_multiplier
+            line_wins = [win['payout'] for win in self.wins]
+        else:
+            total_win = self.payout_multiplier * bet_amount
+            line_wins = [win['payout'] * bet_amount for win in self.wins]
+        
+        # Generate events for Stake Engine
+        events = []
         
-        # Final win event
+        # Reveal event - shows the board symbols
         events.append({
-            "index": 4,
-            "type": "finalWin",
-            "amount": total_win
+            "index": 0,
+            "type": "reveal",
+            "board": self.board,
+            "paddingPositions": [],
+            "gameType": "basegame",
+            "anticipation": []
         })
+        
+        # Win info event - if there are wins
+        if self.wins:
+            win_info = {
+                "index": 1,
+                "type": "winInfo",
+                "totalWin": total_win,
+                "wins": [
+                    {
+                        "symbol": win['symbol'],
+                        "kind": win['count'],
+                        "win": line_win,
+                        "positions": win['positions'],
+                        "meta": {}
+                    } for win, line_win in zip(self.wins, line_wins)
+                ]
+            }
+            events.append(win_info)
+            
+            # Set win event (win level follows the unit-bet multiplier)
+            events.append({
+                "index": 2,
+                "type": "setWin",
+                "amount": total_win,
+                "winLevel": get_win_level(self.payout_multiplier)
+            })
+            
+            # Total win event
+            events.append({
+                "index": 3,
+                "type": "setTotalWin",
+                "amount": total_win
+            })
+            
+            # Final win event
+            events.append({
+                "index": 4,
+                "type": "finalWin",
+                "amount": total_win
+            })
+        
+        # Return game result
+        return {
+            "id": self.id,
+            "payoutMultiplier": total_win,
+            "events": events,
+            "criteria": self.criteria,
+            "baseGameWins": total_win if bet_amount is not None else total_win / 100.0,  # Normalized win amount in books
+            "freeGameWins": 0.0
+        }
+
+def spin(config: CompiledGameConfig, rng: CounterRNG = None, counter: int = None) -> SpinResult:
+    """
+    Evaluate the spin at `counter` of `rng` (the process generator and its
+    next counter when omitted) without building its events.
+    
+    The counter becomes the result id, so passing the same generator and
+    counter again replays the spin exactly.
+    """
+    rng = rng or spin_rng.default_rng()
+    if counter is None:
+        counter = rng.reserve()
     
-    # Return game result
-    result = {
-        "id": random.randint(1, 1000000),
-        "payoutMultiplier": total_win,
-        "events": events,
-        "criteria": "basegame",
-        "baseGameWins": total_win / 100.0,  # Normalized win amount
-        "freeGameWins": 0.0
-    }
-    
-    return result
+    if instrumentation.ENABLED:
+        return _spin_instrumented(config, rng, counter)
+    
+    # Generate random board
+    board = generate_board(config, rng, counter)
+    
+    # Check for wins
+    wins = check_paylines(board, config.paylines, config.paytable, config.payline_table)
+    
+    return SpinResult(counter, board, wins)
 
-def generate_board(config: GameConfig) -> List[str]:
-    """Generate a random 3x5 slot board."""
+def _spin_instrumented(config: CompiledGameConfig, rng: CounterRNG, counter: int) -> SpinResult:
+    """`spin` with each stage timed; kept separate so the plain path pays nothing."""
+    now = instrumentation.now
+    start = now()
+    board = generate_board(config, rng, counter)
+    generated = now()
+    wins = check_paylines(board, config.paylines, config.paytable, config.payline_table)
+    evaluated = now()
+    
+    instrumentation.metrics.observe_many((
+        ("generate_board", generated - start),
+        ("check_paylines", evaluated - generated),
+        ("spin", evaluated - start)
+    ))
+    instrumentation.increment("spins")
+    if wins:
+        instrumentation.increment("winning_spins")
+    
+    return SpinResult(counter, board, wins)
+
+def run_spin(config: CompiledGameConfig, rng: CounterRNG = None, counter: int = None) -> Dict[str, Any]:
+    """
+    Main game logic function required by Stake Engine.
+    Generates a single spin result with all events.
+    
+    See `spin` for the meaning of `rng` and `counter`.
+    """
+    return spin(config, rng, counter).to_dict()
+
+def build_spin_result(config: CompiledGameConfig, board: List[str], wins: List[Dict[str, Any]], sim_id: int = None) -> Dict[str, Any]:
+    """
+    Build the Stake Engine result for an evaluated board.
+    
+    Args:
+        config: Game configuration
+        board: List of symbols representing the game board
+        wins: Winning combinations from `check_paylines`
+        sim_id: Simulation id for the result (random when omitted)
+    
+    Returns:
+        Game result with all events
+    """
+    return SpinResult(sim_id if sim_id is not None else random.randint(1, 1000000), board, wins).to_dict()
+
+def generate_board(config: CompiledGameConfig, rng: CounterRNG = None, counter: int = None) -> List[str]:
+    """Generate a random 3x5 slot board from the spin at `counter` of `rng`."""
+    rng = rng or spin_rng.default_rng()
+    if counter is None:
+        counter = rng.reserve()
+    
+    # Random position on each reel strip
+    stops = rng.stops(counter, config.stop_counts)
     board = []
     
     for reel in range(config.reels):
         reel_symbols = config.reel_strips[reel]
-        # Pick random position on reel strip
-        start_pos = random.randint(0, len(reel_symbols) - config.rows)
+        start_pos = stops[reel]
         
         # Take consecutive symbols for this reel
         for row in range(config.rows):
@@ -115,6 +213,6 @@ def get_win_level(win_amount: float) -> int:
 
 if __name__ == "__main__":
     # Test the game logic
-    config = GameConfig()
+    config = load_config()
     result = run_spin(config)
     print(json.dumps(result, indent=2))
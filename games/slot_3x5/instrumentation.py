@@ -0,0 +1,112 @@
+"""
+Optional stage timers and counters for the spin path.
+Off unless STAKE_INSTRUMENTATION is set; read out in Prometheus text format.
+"""
+
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+# Checked by callers before taking any timestamps, so a disabled build pays
+# one attribute lookup per instrumented call
+ENABLED = os.environ.get("STAKE_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+
+# Histogram upper edges for stage durations, in seconds
+STAGE_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1)
+
+METRIC_PREFIX = "stake"
+
+now = time.perf_counter_ns
+
+class Metrics:
+    """
+    Stage duration histograms and event counters.
+    
+    Durations are kept in nanoseconds and bucketed on the way in, so each
+    observation is one bisect and a few additions under a lock.
+    """
+    
+    def __init__(self, buckets: Iterable[float] = STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._bucket_edges_ns = [edge * 1e9 for edge in self.buckets]
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self) -> None:
+        with self._lock:
+            # stage -> [count, total_ns, per-bucket counts (last is +Inf)]
+            self.stages: Dict[str, List] = {}
+            self.counters: Dict[str, int] = {}
+    
+    def _observe(self, stage: str, elapsed_ns: int) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0, 0, [0] * (len(self.buckets) + 1)]
+        entry[0] += 1
+        entry[1] += elapsed_ns
+        entry[2][bisect.bisect_left(self._bucket_edges_ns, elapsed_ns)] += 1
+    
+    def observe(self, stage: str, elapsed_ns: int) -> None:
+        """Record one duration of a stage."""
+        with self._lock:
+            self._observe(stage, elapsed_ns)
+    
+    def observe_many(self, durations: Iterable[Tuple[str, int]]) -> None:
+        """Record several (stage, elapsed_ns) pairs, taking the lock once."""
+        with self._lock:
+            for stage, elapsed_ns in durations:
+                self._observe(stage, elapsed_ns)
+    
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            stages = {stage: (count, total, list(buckets)) for stage, (count, total, buckets) in self.stages.items()}
+            counters = dict(self.counters)
+        
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each stage of the spin path.",
+            f"# TYPE {name} histogram"
+        ]
+        for stage, (count, total, buckets) in sorted(stages.items()):
+            cumulative = 0
+            for edge, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{edge:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total / 1e9:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        
+        for counter, value in sorted(counters.items()):
+            counter_name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {counter_name} counter")
+            lines.append(f"{counter_name} {value}")
+        
+        return '\n'.join(lines) + '\n'
+
+# Process-wide metrics shared by the engine and the server
+metrics = Metrics()
+
+def enable() -> None:
+    global ENABLED
+    ENABLED = True
+
+def disable() -> None:
+    global ENABLED
+    ENABLED = False
+
+def observe(stage: str, start_ns: int) -> None:
+    """Record the time since `start_ns` (from `now()`) against a stage."""
+    metrics.observe(stage, now() - start_ns)
+
+def increment(counter: str, amount: int = 1) -> None:
+    metrics.increment(counter, amount)
+
+def render() -> str:
+    return metrics.render()
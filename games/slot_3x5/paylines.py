@@ -1,23 +1,108 @@
-from typing import List, Dict, Any, Tuple
+import itertools
+from typing import List, Dict, Any, Tuple, Sequence
 
-def check_paylines(board: List[str], paylines: List[List[int]], paytable: Dict[str, Dict[int, float]]) -> List[Dict[str, Any]]:
+class CompiledPaytable:
+    """
+    Payline results for every possible line content, built once from a paytable.
+    
+    A line is encoded as a base-N integer of symbol ids (first reel most
+    significant), where N is the number of symbols. `results[code]` holds the
+    (symbol, count, payout) tuple for a winning line, or None.
+    """
+    
+    def __init__(self, paytable: Dict[str, Dict[int, float]], line_length: int = 5, symbols: Sequence[str] = None):
+        self.symbols = list(symbols) if symbols is not None else list(paytable)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.base = len(self.symbols)
+        self.line_length = line_length
+        self.results: List[Tuple[str, int, float] | None] = []
+        
+        payline = list(range(line_length))
+        for line_symbols in itertools.product(self.symbols, repeat=line_length):
+            win = check_single_payline(line_symbols, payline, paytable, 0)
+            self.results.append((win['symbol'], win['count'], win['payout']) if win else None)
+    
+    def encode(self, line_symbols: Sequence[str]) -> int:
+        """Encode a sequence of symbols as a line code."""
+        code = 0
+        for symbol in line_symbols:
+            code = code * self.base + self.symbol_ids[symbol]
+        return code
+
+# Compiled tables keyed by paytable content and line length, so equal
+# paytables share a table and a changed paytable gets a new one
+_compiled_paytables: Dict[Tuple[Tuple, int], CompiledPaytable] = {}
+
+def compile_paytable(paytable: Dict[str, Dict[int, float]], line_length: int = 5) -> CompiledPaytable:
+    """
+    Get the compiled payline table for a paytable, building it on first use.
+    
+    Args:
+        paytable: Payout table for symbol combinations
+        line_length: Number of positions on each payline
+    
+    Returns:
+        Compiled table shared by every caller using the same paytable
+    """
+    content = tuple((symbol, tuple(sorted(pays.items()))) for symbol, pays in paytable.items())
+    key = (content, line_length)
+    table = _compiled_paytables.get(key)
+    if table is None:
+        table = _compiled_paytables[key] = CompiledPaytable(paytable, line_length)
+    return table
+
+def check_paylines(board: List[str], paylines: List[List[int]], paytable: Dict[str, Dict[int, float]], table: CompiledPaytable = None) -> List[Dict[str, Any]]:
     """
     Check all paylines for winning combinations.
     
+    Each line is scored with a single lookup into the compiled paytable, which
+    gives the same results as `check_single_payline`.
+    
     Args:
         board: List of symbols representing the game board
         paylines: List of payline definitions (position indices)
         paytable: Payout table for symbol combinations
+        table: Compiled paytable to use (looked up from `paytable` when omitted)
     
     Returns:
         List of winning combinations with details
     """
+    if not paylines:
+        return []
+    
+    if table is None:
+        table = compile_paytable(paytable, len(paylines[0]))
+    try:
+        symbol_ids = [table.symbol_ids[symbol] for symbol in board]
+    except KeyError:
+        # Symbols outside the paytable can't be encoded; score line by line
+        wins = []
+        for line_index, payline in enumerate(paylines):
+            win = check_single_payline(board, payline, paytable, line_index)
+            if win:
+                wins.append(win)
+        return wins
+    
+    base = table.base
+    results = table.results
     wins = []
     
     for line_index, payline in enumerate(paylines):
-        win = check_single_payline(board, payline, paytable, line_index)
-        if win:
-            wins.append(win)
+        code = 0
+        for pos in payline:
+            code = code * base + symbol_ids[pos]
+        
+        result = results[code]
+        if result is not None:
+            symbol, count, payout = result
+            wins.append({
+                'symbol': symbol,
+                'count': count,
+                'payout': payout,
+                'positions': payline[:count],
+                'line': line_index,
+                'line_positions': payline[:count]
+            })
     
     return wins
 
@@ -7,21 +7,85 @@ Generates the required outcome files and lookup tables.
 import json
 import csv
 import os
+import sys
 import gzip
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from game_config import GameConfig
-from gamestate import run_spin
+import glob
+import hashlib
+import shutil
+import numpy as np
+from collections import deque
+from functools import partial
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from game_config import CompiledGameConfig, load_config
+from gamestate import SpinResult, spin
+from spin_batch import run_spins_batch, iter_batch_results, outcome_keys, select_spins
+from spin_rng import CounterRNG, mode_stream
+
+# Add the math engine directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent / "math_engine"))
+
+from books import BooksWriter
+from checkpoint import Checkpoint, sync_position, reopen_at
+from lookup_columns import LookupColumnsWriter, load_lookup_columns
+from sim_stats import PayoutStats
+from weight_optimizer import optimize_lookup_table
 
 # Simulation parameters
 num_threads = 10
 compression = True
 
+# "process" runs seeded blocks on a process pool; "thread" is the legacy
+# thread pool. Both key simulation id i to spin (seed, mode_stream(mode), i),
+# so they produce the same outcomes for the same seed
+execution_mode = "process"
+num_workers = os.cpu_count() or 1
+block_size = int(1e4)  # spins per seeded block
+master_seed = None     # set to reproduce a previous run; None draws a fresh seed
+
+# "jsonl" writes books_<mode>.jsonl[.gz], "blocks" writes the random-access
+# books_<mode>.books + .idx pair, "both" writes both. "shards" has every
+# worker write its own books, lookup and criteria shard under
+# library/books/shards_<mode>/, listed in books_<mode>_manifest.json.
+# Compressed books are gzip members written per block, so they compress in
+# parallel and concatenate into one valid gzip file.
+books_format = "jsonl"
+merge_shards = True    # with "shards", also concatenate them into books_<mode>.jsonl[.gz]
+
+# Merge spins with identical outcomes (same board, so same wins) into one
+# book entry whose lookup-table weight is its number of spins. RTP and the
+# PAR statistics are unchanged; ids then number distinct outcomes, not spins.
+# Process execution only, and not with sharded books.
+dedup_books = False
+
+# Save a checkpoint to library/books/checkpoint_<mode>.json every this many
+# blocks (0 disables). Rerunning with the same parameters resumes from it
+# and writes the same files as an uninterrupted run. Process execution only.
+checkpoint_every = 50
+
+# PAR sheet payout histogram upper edges (see sim_stats.PayoutStats)
+par_bin_edges = (0, 10, 50, 100)
+
 num_sim_args = {
     "base": int(1e5),  # 100k base game simulations
     "bonus": int(1e4), # 10k bonus simulations (if applicable)
 }
 
+# Convergence-driven run length: a mode listed here keeps simulating blocks
+# until the 95% confidence interval half-widths of RTP and hit frequency
+# (in percentage points) are within its targets, after at least min_sims
+# spins. Its num_sim_args entry is then the spin budget. Process execution only.
+convergence_targets = {
+    # "base": {"rtp": 2.0, "hit_frequency": 0.1, "min_sims": int(1e5)},
+}
+
+# Optional payout-bucket targets for optimize_rtp, as (low, high, percent)
+# meaning percent of weight on low <= payout < high
+optimization_buckets = {
+    "base": [],
+}
+
 run_conditions = {
     "run_sims": True,
     "run_optimization": True,
@@ -29,23 +93,442 @@ run_conditions = {
     "upload_data": False,
 }
 
-def run_simulation_batch(config: GameConfig, batch_size: int, start_id: int) -> List[Dict[str, Any]]:
-    """Run a batch of simulations in a single thread."""
-    results = []
+def run_simulation_batch(config: CompiledGameConfig, batch_size: int, start_id: int, rng: CounterRNG) -> List[SpinResult]:
+    """Run a batch of simulations in a single thread; events are built when the books are written."""
+    return [spin(config, rng, sim_id) for sim_id in range(start_id, start_id + batch_size)]
+
+def encode_books(lines: List[str], compress: bool) -> bytes:
+    """Books lines as bytes, as one gzip member when compressing."""
+    data = ''.join(lines).encode()
+    # Fixed mtime keeps the output identical between runs
+    return gzip.compress(data, mtime=0) if compress else data
+
+def write_shard(shard_dir: str, block_index: int, books_lines: List[str], lookup_rows: List[List[Any]], criteria_rows: List[List[Any]], compress: bool) -> Dict[str, Any]:
+    """
+    Write one block's books, lookup and criteria shard files.
+    
+    Lookup and criteria shards have no header, so they concatenate into the
+    full tables. Returns the block's manifest entry.
+    """
+    books_name = f"books_{block_index:06d}.jsonl" + (".gz" if compress else "")
+    lookup_name = f"lookup_{block_index:06d}.csv"
+    criteria_name = f"criteria_{block_index:06d}.csv"
+    
+    data = encode_books(books_lines, compress)
+    with open(os.path.join(shard_dir, books_name), 'wb') as f:
+        f.write(data)
+    with open(os.path.join(shard_dir, lookup_name), 'w', newline='') as f:
+        csv.writer(f).writerows(lookup_rows)
+    with open(os.path.join(shard_dir, criteria_name), 'w', newline='') as f:
+        csv.writer(f).writerows(criteria_rows)
+    
+    return {
+        "index": block_index,
+        "first_id": lookup_rows[0][0],
+        "last_id": lookup_rows[-1][0],
+        "records": len(lookup_rows),
+        "books": books_name,
+        "books_bytes": len(data),
+        "books_sha256": hashlib.sha256(data).hexdigest(),
+        "lookup": lookup_name,
+        "criteria": criteria_name
+    }
+
+def concatenate_files(paths: List[str], output) -> None:
+    """Append the bytes of each file to an open binary file."""
+    for path in paths:
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, output)
+
+def run_seeded_block(seed: int, mode: str, block_index: int, start_id: int, batch_size: int, bin_edges: Tuple[float, ...] = par_bin_edges, dedup: bool = False, books_output: str = "jsonl", compress: bool = True, shard_dir: str = None) -> Dict[str, Any]:
+    """
+    Run one block of simulations, jumping straight to its counters.
+    
+    Simulation id i is the spin at counter i of the mode's stream, so the
+    output does not depend on which worker runs the block or how many
+    workers there are, and any id can be replayed from its SpinKey.
+    
+    With `dedup`, the block returns its distinct outcomes (in order of first
+    occurrence) with their keys and counts instead of books and lookup rows;
+    the caller merges them across blocks and assigns the book ids.
+    
+    Otherwise books are returned in the form `books_output` (a books_format
+    value) needs: compressed bytes for "jsonl", lines for "blocks", or
+    written straight to `shard_dir` for "shards".
+    """
+    config = load_config()
+    
+    rng = CounterRNG(seed, mode_stream(mode))
+    batch = run_spins_batch(config, batch_size, rng, start_counter=start_id)
+    
+    stats = PayoutStats(bin_edges)
+    stats.update_batch(batch["payouts"])
+    
+    if dedup:
+        keys, first, counts = np.unique(outcome_keys(batch), return_index=True, return_counts=True)
+        order = np.argsort(first)
+        return {
+            "outcome_keys": keys[order].tolist(),
+            "outcome_counts": counts[order].tolist(),
+            "outcomes": select_spins(batch, first[order]),
+            "total_wins": float(batch["payouts"].sum()),
+            "stats": stats
+        }
+    
+    books_lines = []
+    lookup_rows = []
+    criteria_rows = []
+    for result in iter_batch_results(config, batch, start_id):
+        books_lines.append(json.dumps(result) + '\n')
+        lookup_rows.append([result["id"], 1, result["payoutMultiplier"]])
+        criteria_rows.append([result["id"], result["criteria"]])
+    
+    block = {
+        "lookup_rows": lookup_rows,
+        "criteria_rows": criteria_rows,
+        "total_wins": float(batch["payouts"].sum()),
+        "stats": stats
+    }
+    if books_output in ("jsonl", "both"):
+        block["books_data"] = encode_books(books_lines, compress)
+    if books_output in ("blocks", "both"):
+        block["books_lines"] = books_lines
+    if books_output == "shards":
+        block["shard"] = write_shard(shard_dir, block_index, books_lines, lookup_rows, criteria_rows, compress)
+    return block
+
+def iter_block_results(executor: Executor, run_block, blocks: List[Tuple[int, int, int]], window: int) -> Iterator[Tuple[Tuple[int, int, int], Dict[str, Any]]]:
+    """
+    Run blocks on a pool with at most `window` submitted ahead of the reader.
+    
+    Yields (block, result) in block order. Closing the generator cancels
+    the blocks that have not started, so a run can stop early.
+    """
+    futures = deque()
+    remaining = iter(blocks)
+    try:
+        while True:
+            while len(futures) < window:
+                block = next(remaining, None)
+                if block is None:
+                    break
+                futures.append((block, executor.submit(run_block, *block)))
+            if not futures:
+                return
+            block, future = futures.popleft()
+            yield block, future.result()
+    finally:
+        for _, future in futures:
+            future.cancel()
+
+def precision_reached(stats: PayoutStats, target: Dict[str, Any]) -> bool:
+    """Whether the RTP and hit frequency intervals are as narrow as a convergence target asks."""
+    if stats.count < target.get("min_sims", 0):
+        return False
+    precision = stats.precision()
+    return all(precision[name] <= target[name] for name in ("rtp", "hit_frequency") if name in target)
+
+def run_simulations_parallel(mode: str, num_sims: int, seed: int = None) -> int:
+    """
+    Run simulations for a game mode on a process pool with seeded RNG streams.
+    
+    Identical seeds produce byte-identical books, lookup tables and criteria
+    files, whatever the number of workers. With `dedup_books`, each distinct
+    outcome is written once, weighted by the number of spins that produced it.
+    Workers compress (or, with sharded books, write) their own blocks, so the
+    coordinator only appends finished bytes.
+    
+    Every `checkpoint_every` blocks the written length of each output file,
+    the merged statistics and any dedup state are checkpointed. A later run
+    with the same parameters (the seed may be left out) truncates the files
+    back to the checkpoint and carries on from the next block; simulation
+    ids are RNG counters, so no generator state needs saving.
+    
+    With a convergence target for the mode, `num_sims` is a budget: blocks
+    are merged in order and the run stops after the first block at which
+    the target precision is reached.
+    
+    Returns:
+        The master seed used for the run
+    """
+    if dedup_books and books_format == "shards":
+        raise ValueError("dedup_books cannot be combined with sharded books")
+    
+    os.makedirs("library/books", exist_ok=True)
+    os.makedirs("library/lookup_tables", exist_ok=True)
+    os.makedirs("library/publish_files", exist_ok=True)
+    
+    # The game definition is part of the run's identity: a changed config
+    # starts afresh rather than appending to the old prefix
+    config = load_config()
+    checkpoint = Checkpoint(f"library/books/checkpoint_{mode}.json", {
+        "mode": mode,
+        "config": config.content_hash,
+        "num_sims": num_sims,
+        "seed": seed,
+        "block_size": block_size,
+        "books_format": books_format,
+        "compression": compression,
+        "dedup_books": dedup_books,
+        "bin_edges": par_bin_edges,
+        "convergence": convergence_targets.get(mode)
+    })
+    resume = checkpoint.load() if checkpoint_every else None
+    seed = checkpoint.params["seed"]
+    if seed is None:
+        seed = checkpoint.params["seed"] = np.random.SeedSequence().entropy
+    target = convergence_targets.get(mode)
+    if target:
+        print(f"Running up to {num_sims} simulations for {mode} mode on {num_workers} processes (seed {seed}) until {target}...")
+    else:
+        print(f"Running {num_sims} simulations for {mode} mode on {num_workers} processes (seed {seed})...")
+    
+    blocks = [
+        (block_index, start_id, min(block_size, num_sims - start_id + 1))
+        for block_index, start_id in enumerate(range(1, num_sims + 1, block_size))
+    ]
+    first_block = resume["completed_blocks"] if resume else 0
+    if resume:
+        print(f"Resuming from checkpoint after block {first_block - 1} of {len(blocks)}")
+    
+    books_filename = f"library/books/books_{mode}.jsonl"
+    lookup_filename = f"library/lookup_tables/lookUpTable_{mode}.csv"
+    criteria_filename = f"library/lookup_tables/lookUpTableIdToCriteria_{mode}.csv"
+    
+    if compression:
+        books_filename += ".gz"
+    
+    # Blocks arrive already encoded (one gzip member each when compressed)
+    books_file = None
+    if books_format in ("jsonl", "both"):
+        books_file = reopen_at(books_filename, resume["books"]) if resume else open(books_filename, 'wb')
+    
+    shard_dir = None
+    shards: List[Dict[str, Any]] = resume["shards"] if resume else []
+    if books_format == "shards":
+        shard_dir = f"library/books/shards_{mode}"
+        os.makedirs(shard_dir, exist_ok=True)
+        if not resume:
+            for stale in glob.glob(os.path.join(shard_dir, "*_[0-9]*.*")):
+                os.remove(stale)
+    
+    blocks_writer = None
+    if books_format in ("blocks", "both"):
+        blocks_writer = BooksWriter(f"library/books/books_{mode}.books", resume=resume["blocks_writer"] if resume else None)
     
-    for i in range(batch_size):
-        sim_id = start_id + i
-        result = run_spin(config)
-        result["id"] = sim_id
-        results.append(result)
+    stats = PayoutStats.from_dict(resume["stats"]) if resume else PayoutStats(par_bin_edges)
     
-    return results
+    def write_books_lines(lines: List[str], first_id: int) -> None:
+        if books_file:
+            books_file.write(encode_books(lines, compression))
+        if blocks_writer:
+            for book_id, line in enumerate(lines, first_id):
+                blocks_writer.write_line(book_id, line)
+    
+    # Distinct outcomes so far: key -> index, with their weights, payouts
+    # and criteria (book id is index + 1)
+    outcome_index: Dict[bytes, int] = {}
+    outcome_weights: List[int] = []
+    outcome_payouts: List[float] = []
+    outcome_criteria: List[str] = []
+    if resume and dedup_books:
+        outcomes = resume["outcomes"]
+        outcome_index = {bytes.fromhex(key): index for index, key in enumerate(outcomes["keys"])}
+        outcome_weights = outcomes["weights"]
+        outcome_payouts = outcomes["payouts"]
+        outcome_criteria = outcomes["criteria"]
+    
+    def open_table(filename: str, position_key: str):
+        if resume:
+            return reopen_at(filename, resume[position_key], 'a', newline='')
+        return open(filename, 'w', newline='')
+    
+    # The columns writer closes last so its meta.json is newer than the CSV
+    with LookupColumnsWriter(lookup_filename, resume=resume["columns"] if resume else None) as columns_writer, \
+            open_table(lookup_filename, "lookup") as lookup_file, \
+            open_table(criteria_filename, "criteria") as criteria_file, \
+            ProcessPoolExecutor(max_workers=num_workers) as executor:
+        lookup_writer = csv.writer(lookup_file)
+        criteria_writer = csv.writer(criteria_file)
+        if not resume:
+            lookup_writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
+            criteria_writer.writerow(['simulation_id', 'criteria'])
+        
+        def save_checkpoint(completed_blocks: int) -> None:
+            # Files are synced before the checkpoint that points into them
+            state = {
+                "completed_blocks": completed_blocks,
+                "books": sync_position(books_file) if books_file else None,
+                "blocks_writer": blocks_writer.checkpoint() if blocks_writer else None,
+                "lookup": sync_position(lookup_file),
+                "criteria": sync_position(criteria_file),
+                "columns": columns_writer.checkpoint(),
+                "shards": shards,
+                "stats": stats.to_dict()
+            }
+            if dedup_books:
+                state["outcomes"] = {
+                    "keys": [key.hex() for key in outcome_index],
+                    "weights": outcome_weights,
+                    "payouts": outcome_payouts,
+                    "criteria": outcome_criteria
+                }
+            checkpoint.save(state)
+        
+        run_block = partial(
+            run_seeded_block, seed, mode,
+            bin_edges=par_bin_edges,
+            dedup=dedup_books,
+            books_output=books_format,
+            compress=compression,
+            shard_dir=shard_dir
+        )
+        # Results come back in block order, so blocks are written in id order
+        block_results = iter_block_results(executor, run_block, blocks[first_block:], 2 * num_workers)
+        converged = False
+        
+        for (block_index, start_id, batch_size), block in block_results:
+            if dedup_books:
+                new_outcomes = []
+                for position, (key, count) in enumerate(zip(block["outcome_keys"], block["outcome_counts"])):
+                    index = outcome_index.get(key)
+                    if index is None:
+                        outcome_index[key] = len(outcome_weights)
+                        outcome_weights.append(count)
+                        new_outcomes.append(position)
+                    else:
+                        outcome_weights[index] += count
+                
+                first_id = len(outcome_payouts) + 1
+                results = list(iter_batch_results(config, select_spins(block["outcomes"], new_outcomes), first_id))
+                write_books_lines([json.dumps(result) + '\n' for result in results], first_id)
+                outcome_payouts.extend(result["payoutMultiplier"] for result in results)
+                outcome_criteria.extend(result["criteria"] for result in results)
+            else:
+                if books_file:
+                    books_file.write(block["books_data"])
+                if blocks_writer:
+                    for sim_id, line in enumerate(block["books_lines"], start_id):
+                        blocks_writer.write_line(sim_id, line)
+                if "shard" in block:
+                    shards.append(block["shard"])
+                else:
+                    lookup_writer.writerows(block["lookup_rows"])
+                    criteria_writer.writerows(block["criteria_rows"])
+                columns_writer.append_rows(block["lookup_rows"], block["criteria_rows"])
+            stats.merge(block["stats"])
+            
+            rtp = (block["total_wins"] / batch_size) * 100
+            print(f"Block {block_index} finished with {rtp:.3f} RTP.")
+            
+            if target and precision_reached(stats, target):
+                converged = True
+                break
+            
+            if checkpoint_every and (block_index + 1) % checkpoint_every == 0 and block_index + 1 < len(blocks):
+                save_checkpoint(block_index + 1)
+        block_results.close()
+        
+        num_simulated = stats.count
+        if target:
+            precision = stats.precision()
+            print(f"{'Converged' if converged else 'Spin budget reached'} after {num_simulated} simulations: "
+                  f"RTP ±{precision['rtp']:.4f}%, hit frequency ±{precision['hit_frequency']:.4f}%")
+        
+        if dedup_books:
+            # Weights are only final once every block is merged
+            outcome_ids = range(1, len(outcome_weights) + 1)
+            lookup_rows = [list(row) for row in zip(outcome_ids, outcome_weights, outcome_payouts)]
+            criteria_rows = [list(row) for row in zip(outcome_ids, outcome_criteria)]
+            lookup_writer.writerows(lookup_rows)
+            criteria_writer.writerows(criteria_rows)
+            columns_writer.append_rows(lookup_rows, criteria_rows)
+            print(f"{num_simulated} simulations merged into {len(outcome_weights)} distinct outcomes")
+        
+        if shards:
+            # The full tables are the shards in id order after the headers
+            for name, output in (("lookup", lookup_file), ("criteria", criteria_file)):
+                output.flush()
+                concatenate_files([os.path.join(shard_dir, shard[name]) for shard in shards], output.buffer)
+    
+    if shards:
+        # Blocks running when a converged run stopped may have left shards behind
+        kept = {shard[name] for shard in shards for name in ("books", "lookup", "criteria")}
+        for path in glob.glob(os.path.join(shard_dir, "*_[0-9]*.*")):
+            if os.path.basename(path) not in kept:
+                os.remove(path)
+        
+        merged_books = None
+        if merge_shards:
+            with open(books_filename, 'wb') as f:
+                concatenate_files([os.path.join(shard_dir, shard["books"]) for shard in shards], f)
+            merged_books = os.path.basename(books_filename)
+        
+        manifest = {
+            "mode": mode,
+            "num_sims": num_simulated,
+            "compression": compression,
+            "shard_dir": os.path.basename(shard_dir),
+            "merged_books": merged_books,
+            "shards": shards
+        }
+        with open(f"library/books/books_{mode}_manifest.json", 'w') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Wrote {len(shards)} shards to {shard_dir}")
+    
+    if books_file:
+        books_file.close()
+    if blocks_writer:
+        blocks_writer.close()
+    
+    run_info = {
+        "mode": mode,
+        "num_sims": num_simulated,
+        "master_seed": seed,
+        # Simulation <id> replays with spin key master_seed:rng_stream:<id>
+        "rng_stream": mode_stream(mode),
+        "block_size": block_size,
+        "execution_mode": "process",
+        # With dedup, book ids number distinct outcomes and weights count spins
+        "dedup_books": dedup_books,
+        "book_entries": len(outcome_weights) if dedup_books else num_simulated
+    }
+    if target:
+        run_info["convergence"] = {
+            "target": target,
+            "achieved": stats.precision(),
+            "converged": converged,
+            "sim_budget": num_sims
+        }
+    with open(f"library/books/run_info_{mode}.json", 'w') as f:
+        json.dump(run_info, f, indent=2)
+    
+    save_stats(mode, stats)
+    checkpoint.remove()
+    
+    print(f"Generated {num_simulated} simulations for {mode} mode")
+    print(f"Master seed: {seed}")
+    print(f"Files written to library/ directory")
+    
+    return seed
 
 def run_simulations(mode: str, num_sims: int) -> None:
     """Run simulations for a specific game mode."""
+    if execution_mode == "process":
+        run_simulations_parallel(mode, num_sims, master_seed)
+        return
+    if dedup_books:
+        raise ValueError("dedup_books needs execution_mode = \"process\"")
+    if books_format == "shards":
+        raise ValueError("books_format = \"shards\" needs execution_mode = \"process\"")
+    if mode in convergence_targets:
+        raise ValueError("convergence_targets need execution_mode = \"process\"")
+    
     print(f"Running {num_sims} simulations for {mode} mode...")
     
-    config = GameConfig()
+    config = load_config()
+    rng = CounterRNG(master_seed, mode_stream(mode))
+    print(f"Seed {rng.seed}; simulation <id> replays with key {rng.seed}:{rng.stream}:<id>")
     
     # Create output directories
     os.makedirs("library/books", exist_ok=True)
@@ -67,7 +550,7 @@ def run_simulations(mode: str, num_sims: int) -> None:
             if thread_id == num_threads - 1:
                 actual_batch_size = num_sims - (thread_id * batch_size)
             
-            future = executor.submit(run_simulation_batch, config, actual_batch_size, start_id)
+            future = executor.submit(run_simulation_batch, config, actual_batch_size, start_id, rng)
             futures.append((thread_id, future))
         
         # Collect results
@@ -77,27 +560,33 @@ def run_simulations(mode: str, num_sims: int) -> None:
                 all_results.extend(batch_results)
                 
                 # Calculate thread RTP
-                total_wins = sum(r["payoutMultiplier"] for r in batch_results)
+                total_wins = sum(r.payout_multiplier for r in batch_results)
                 rtp = (total_wins / len(batch_results)) * 100
                 print(f"Thread {thread_id} finished with {rtp:.3f} RTP.")
-                
+            
             except Exception as e:
                 print(f"Thread {thread_id} failed: {e}")
     
     # Sort results by ID
-    all_results.sort(key=lambda x: x["id"])
+    all_results.sort(key=lambda x: x.id)
     
     # Write books file
-    books_filename = f"library/books/books_{mode}.jsonl"
-    if compression:
-        books_filename += ".gz"
-        with gzip.open(books_filename, 'wt') as f:
-            for result in all_results:
-                f.write(json.dumps(result) + '\n')
-    else:
-        with open(books_filename, 'w') as f:
+    if books_format in ("jsonl", "both"):
+        books_filename = f"library/books/books_{mode}.jsonl"
+        if compression:
+            books_filename += ".gz"
+            with gzip.open(books_filename, 'wt') as f:
+                for result in all_results:
+                    f.write(json.dumps(result.to_dict()) + '\n')
+        else:
+            with open(books_filename, 'w') as f:
+                for result in all_results:
+                    f.write(json.dumps(result.to_dict()) + '\n')
+    
+    if books_format in ("blocks", "both"):
+        with BooksWriter(f"library/books/books_{mode}.books") as writer:
             for result in all_results:
-                f.write(json.dumps(result) + '\n')
+                writer.write_record(result.to_dict())
     
     # Write lookup table
     lookup_filename = f"library/lookup_tables/lookUpTable_{mode}.csv"
@@ -107,9 +596,9 @@ def run_simulations(mode: str, num_sims: int) -> None:
         
         for result in all_results:
             writer.writerow([
-                result["id"],
+                result.id,
                 1,  # Initial weight (will be optimized)
-                result["payoutMultiplier"]
+                result.payout_multiplier
             ])
     
     # Write criteria mapping
@@ -119,96 +608,107 @@ def run_simulations(mode: str, num_sims: int) -> None:
         writer.writerow(['simulation_id', 'criteria'])
         
         for result in all_results:
-            writer.writerow([result["id"], result["criteria"]])
+            writer.writerow([result.id, result.criteria])
+    
+    with LookupColumnsWriter(lookup_filename) as columns_writer:
+        columns_writer.append(
+            [result.id for result in all_results],
+            [1] * len(all_results),
+            [result.payout_multiplier for result in all_results],
+            [result.criteria for result in all_results]
+        )
+    
+    stats = PayoutStats(par_bin_edges)
+    for result in all_results:
+        stats.update(result.payout_multiplier)
+    save_stats(mode, stats)
     
     print(f"Generated {len(all_results)} simulations for {mode} mode")
     print(f"Files written to library/ directory")
 
-def optimize_rtp(mode: str, target_rtp: float = 96.5) -> None:
-    """Optimize simulation weights to achieve target RTP."""
+def optimize_rtp(mode: str, target_rtp: float = 96.5, target_hit_frequency: float = None) -> None:
+    """Optimize simulation weights to achieve target RTP (and hit frequency, if given)."""
     print(f"Optimizing RTP for {mode} mode to {target_rtp}%...")
     
     lookup_file = f"library/lookup_tables/lookUpTable_{mode}.csv"
-    
-    # Read current lookup table
-    simulations = []
-    with open(lookup_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            simulations.append({
-                'id': int(row['simulation_id']),
-                'weight': int(row['weight']),
-                'payout': float(row['payout_multiplier'])
-            })
-    
-    # Simple optimization: adjust weights based on payout distribution
-    total_payout = sum(sim['payout'] for sim in simulations)
-    current_rtp = (total_payout / len(simulations)) * 100
-    
-    adjustment_factor = target_rtp / current_rtp
-    
-    # Write optimized lookup table
     optimized_file = f"library/lookup_tables/lookUpTable_{mode}_optimized.csv"
-    with open(optimized_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
-        
-        for sim in simulations:
-            # Adjust weight inversely to payout to balance RTP
-            if sim['payout'] > 0:
-                new_weight = max(1, int(sim['weight'] * adjustment_factor))
-            else:
-                new_weight = sim['weight']
-            
-            writer.writerow([sim['id'], new_weight, sim['payout']])
+    
+    stats = optimize_lookup_table(lookup_file, optimized_file, target_rtp, target_hit_frequency, optimization_buckets.get(mode))
     
     print(f"Optimized weights written to {optimized_file}")
+    print(f"Optimized RTP: {stats['rtp']:.4f}% (rounding bound {stats['rtp_rounding_bound']:.2e}%)")
+    if "hit_frequency" in stats:
+        print(f"Optimized Hit Frequency: {stats['hit_frequency']:.4f}%")
+
+def save_stats(mode: str, stats: PayoutStats) -> None:
+    """Save the payout statistics gathered while simulating, for the PAR sheet."""
+    with open(f"library/books/stats_{mode}.json", 'w') as f:
+        json.dump(stats.to_dict(), f)
+
+def load_stats(mode: str) -> PayoutStats:
+    """Payout statistics saved by the simulation run, or rebuilt from the lookup table."""
+    stats_file = f"library/books/stats_{mode}.json"
+    if os.path.exists(stats_file):
+        with open(stats_file, 'r') as f:
+            stats = PayoutStats.from_dict(json.load(f))
+        if stats.bin_edges == tuple(par_bin_edges):
+            return stats
+    
+    # Memory-mapped payouts of every simulation
+    simulations = load_lookup_columns(f"library/lookup_tables/lookUpTable_{mode}.csv").payout
+    stats = PayoutStats(par_bin_edges)
+    for start in range(0, len(simulations), block_size):
+        stats.update_batch(simulations[start:start + block_size])
+    return stats
 
 def generate_par_sheet(mode: str) -> None:
     """Generate PAR sheet with game statistics."""
     print(f"Generating PAR sheet for {mode} mode...")
     
-    lookup_file = f"library/lookup_tables/lookUpTable_{mode}.csv"
-    
-    # Read simulations
-    simulations = []
-    with open(lookup_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            simulations.append(float(row['payout_multiplier']))
-    
-    # Calculate statistics
-    total_sims = len(simulations)
-    winning_sims = len([s for s in simulations if s > 0])
-    total_payout = sum(simulations)
-    
-    hit_frequency = (winning_sims / total_sims) * 100
-    rtp = (total_payout / total_sims) * 100
-    max_win = max(simulations)
-    avg_win = total_payout / winning_sims if winning_sims > 0 else 0
+    stats = load_stats(mode)
+    summary = stats.summary()
+    precision = stats.precision()
     
     # Generate PAR sheet
     par_data = {
         "game_name": "3x5 Slot Game",
         "mode": mode,
-        "total_simulations": total_sims,
-        "winning_simulations": winning_sims,
-        "hit_frequency_percent": round(hit_frequency, 2),
-        "rtp_percent": round(rtp, 2),
-        "max_win_multiplier": max_win,
-        "average_win_multiplier": round(avg_win, 2),
-        "variance": "Medium",
+        "total_simulations": summary["simulations"],
+        "winning_simulations": int(summary["winning_weight"]),
+        "hit_frequency_percent": round(summary["hit_frequency_percent"], 2),
+        "rtp_percent": round(summary["rtp_percent"], 2),
+        "rtp_confidence_interval_95": [round(bound, 2) for bound in summary["rtp_confidence_interval_95"]],
+        "hit_frequency_confidence_interval_95": [round(bound, 2) for bound in summary["hit_frequency_confidence_interval_95"]],
+        # Half-widths of the 95% intervals, in percentage points
+        "precision_95": {name: round(value, 4) for name, value in precision.items()},
+        "max_win_multiplier": summary["max_win_multiplier"],
+        "average_win_multiplier": round(summary["average_win_multiplier"], 2),
+        "variance": round(summary["variance"], 4),
+        "standard_deviation": round(summary["standard_deviation"], 4),
+        "volatility_index": round(summary["volatility_index"], 4),
+        "volatility": summary["volatility"],
+        "payout_percentiles": {key: round(value, 2) for key, value in summary["payout_percentiles"].items()},
+        "payout_distribution_percent": {key: round(value, 4) for key, value in summary["payout_distribution_percent"].items()},
         "paylines": 20,
         "reels": "3x5"
     }
     
+    # Convergence-driven runs record their target and whether they met it
+    run_info_file = f"library/books/run_info_{mode}.json"
+    if os.path.exists(run_info_file):
+        with open(run_info_file, 'r') as f:
+            convergence = json.load(f).get("convergence")
+        if convergence:
+            par_data["convergence"] = convergence
+    
     par_filename = f"library/publish_files/par_sheet_{mode}.json"
     with open(par_filename, 'w') as f:
         json.dump(par_data, f, indent=2)
     
     print(f"PAR sheet written to {par_filename}")
-    print(f"Hit Frequency: {hit_frequency:.2f}%")
-    print(f"RTP: {rtp:.2f}%")
+    print(f"Hit Frequency: {summary['hit_frequency_percent']:.2f}%")
+    print(f"RTP: {summary['rtp_percent']:.2f}% ± {precision['rtp']:.2f}")
+    print(f"Volatility: {summary['volatility']} (standard deviation {summary['standard_deviation']:.2f})")
 
 def main():
     """Main simulation runner."""
@@ -0,0 +1,250 @@
+import numpy as np
+from typing import Dict, Any, Iterator, Union
+from game_config import CompiledGameConfig
+from gamestate import build_spin_result
+from spin_rng import CounterRNG
+
+# Batch tables keyed by the config's content hash
+_batch_tables: Dict[str, Dict[str, Any]] = {}
+
+def get_batch_tables(config: CompiledGameConfig) -> Dict[str, Any]:
+    """
+    Get the NumPy forms of the compiled strips and payline table.
+    
+    Symbol ids are the config's, so line codes index straight into
+    `config.payline_table.results`.
+    
+    Args:
+        config: Game configuration
+    
+    Returns:
+        Dictionary of arrays shared by every batch run with this config
+    """
+    cached = _batch_tables.get(config.content_hash)
+    if cached is not None:
+        return cached
+    
+    table = config.payline_table
+    
+    place_values = table.base ** np.arange(config.reels - 1, -1, -1, dtype=np.int64)
+    
+    # One row per reachable stop, matching the range drawn by generate_board
+    windows = []
+    for strip, num_stops in zip(config.reel_strip_ids, config.stop_counts):
+        encoded = np.array(strip, dtype=np.int8)
+        positions = (np.arange(num_stops)[:, None] + np.arange(config.rows)) % len(strip)
+        windows.append(encoded[positions])
+    
+    # Each reel's share of every line code, per stop. Reels are paired so a
+    # batch needs one gather per pair instead of one per reel.
+    contributions = []
+    for reel, reel_windows in enumerate(windows):
+        contribution = np.zeros((len(reel_windows), len(config.paylines)), dtype=np.int32)
+        for line_index, payline in enumerate(config.paylines):
+            for k, pos in enumerate(payline):
+                if pos // config.rows == reel:
+                    contribution[:, line_index] += place_values[k] * reel_windows[:, pos % config.rows]
+        contributions.append(contribution)
+    
+    reel_groups = [tuple(range(reel, min(reel + 2, config.reels))) for reel in range(0, config.reels, 2)]
+    group_windows = []
+    group_contributions = []
+    for group in reel_groups:
+        combined_windows = windows[group[0]]
+        combined = contributions[group[0]]
+        for reel in group[1:]:
+            combined_windows = np.concatenate([
+                np.repeat(combined_windows, len(windows[reel]), axis=0),
+                np.tile(windows[reel], (len(combined_windows), 1))
+            ], axis=1)
+            combined = (combined[:, None, :] + contributions[reel][None, :, :]).reshape(-1, len(config.paylines))
+        # Whole windows are gathered as fixed-size byte records
+        group_windows.append(np.ascontiguousarray(combined_windows).view(f"V{combined_windows.shape[1]}").ravel())
+        group_contributions.append(combined)
+    
+    line_payouts = np.array([result[2] if result else 0 for result in table.results], dtype=np.float64)
+    
+    tables = {
+        "windows": windows,
+        "stop_counts": np.array(config.stop_counts, dtype=np.int32),
+        "reel_groups": reel_groups,
+        "group_windows": group_windows,
+        "group_contributions": group_contributions,
+        "board_dtype": np.dtype([(f"group{i}", w.dtype) for i, w in enumerate(group_windows)]),
+        "line_payouts": line_payouts,
+        "line_ones": np.ones(len(config.paylines), dtype=np.float64)
+    }
+    _batch_tables[config.content_hash] = tables
+    return tables
+
+def run_spins_batch(config: CompiledGameConfig, n: int, rng: Union[CounterRNG, np.random.Generator], start_counter: int = None) -> Dict[str, np.ndarray]:
+    """
+    Run N spins at once on integer arrays.
+    
+    Reel stops are drawn from the same range as `generate_board`, so batches
+    follow the same distribution as `run_spin`. With a CounterRNG, spin i of
+    the batch is exactly `run_spin(config, rng, start_counter + i)`.
+    
+    Args:
+        config: Game configuration
+        n: Number of spins
+        rng: Counter-based generator, or a NumPy generator for unkeyed spins
+        start_counter: Counter of the first spin (the generator's next
+            counters when omitted); ignored for NumPy generators
+    
+    Returns:
+        Dictionary with stops (n, reels), boards (n, reels * rows) of symbol
+        ids, line_codes, line_payouts and win_mask (n, paylines), and
+        payouts (n,)
+    """
+    tables = get_batch_tables(config)
+    stop_counts = tables["stop_counts"]
+    
+    # Drawn reel-major so each reel's stops are contiguous for the gathers
+    if isinstance(rng, CounterRNG):
+        if start_counter is None:
+            start_counter = rng.reserve(n)
+        stops = rng.batch_stops(start_counter, n, config.stop_counts)
+    else:
+        stops = np.empty((config.reels, n), dtype=np.int32)
+        for reel in range(config.reels):
+            stops[reel] = rng.integers(0, stop_counts[reel], size=n, dtype=np.int32)
+    
+    group_indices = []
+    for group in tables["reel_groups"]:
+        index = stops[group[0]]
+        for reel in group[1:]:
+            index = index * stop_counts[reel] + stops[reel]
+        group_indices.append(index)
+    
+    boards = np.empty(n, dtype=tables["board_dtype"])
+    for field, windows, index in zip(tables["board_dtype"].names, tables["group_windows"], group_indices):
+        boards[field] = windows[index]
+    boards = boards.view(np.int8).reshape(n, config.reels * config.rows)
+    
+    line_codes = np.take(tables["group_contributions"][0], group_indices[0], axis=0)
+    for contribution, index in zip(tables["group_contributions"][1:], group_indices[1:]):
+        line_codes += np.take(contribution, index, axis=0)
+    line_payouts = np.take(tables["line_payouts"], line_codes)
+    
+    return {
+        "stops": stops.T,
+        "boards": boards,
+        "line_codes": line_codes,
+        "line_payouts": line_payouts,
+        "win_mask": line_payouts > 0,
+        "payouts": line_payouts @ tables["line_ones"]
+    }
+
+def evaluate_boards(config: CompiledGameConfig, boards: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Score given boards into the batch layout of `run_spins_batch` (without stops).
+    
+    Args:
+        config: Game configuration
+        boards: Symbol ids with shape (n, reels * rows), reel-major
+    
+    Returns:
+        Dictionary with boards, line_codes, line_payouts, win_mask and payouts
+    """
+    tables = get_batch_tables(config)
+    table = config.payline_table
+    
+    paylines = np.array(config.paylines, dtype=np.int64)
+    place_values = table.base ** np.arange(paylines.shape[1] - 1, -1, -1, dtype=np.int64)
+    line_codes = (boards[:, paylines] @ place_values).astype(np.int32)
+    line_payouts = np.take(tables["line_payouts"], line_codes)
+    
+    return {
+        "boards": boards.astype(np.int8),
+        "line_codes": line_codes,
+        "line_payouts": line_payouts,
+        "win_mask": line_payouts > 0,
+        "payouts": line_payouts @ tables["line_ones"]
+    }
+
+def outcome_keys(batch: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Canonical outcome key of each spin in a batch.
+    
+    The board determines the winning lines, so each key is the spin's board
+    as one fixed-size byte record; equal keys are identical outcomes.
+    """
+    boards = np.ascontiguousarray(batch["boards"])
+    return boards.view(f"V{boards.shape[1]}").ravel()
+
+def select_spins(batch: Dict[str, np.ndarray], indices: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sub-batch of the spins at `indices`, in that order."""
+    return {name: values[indices] for name, values in batch.items()}
+
+def iter_batch_results(config: CompiledGameConfig, batch: Dict[str, np.ndarray], start_id: int) -> Iterator[Dict[str, Any]]:
+    """
+    Expand a batch into Stake Engine results for the books.
+    
+    Args:
+        config: Game configuration
+        batch: Output of `run_spins_batch`
+        start_id: Simulation id of the first spin in the batch
+    
+    Yields:
+        Game results in the same format as `run_spin`
+    """
+    table = config.payline_table
+    symbols = config.symbols
+    
+    for i, (board_ids, codes, mask) in enumerate(zip(batch["boards"].tolist(), batch["line_codes"].tolist(), batch["win_mask"].tolist())):
+        board = [symbols[symbol_id] for symbol_id in board_ids]
+        wins = []
+        
+        for line_index, (code, is_win) in enumerate(zip(codes, mask)):
+            if is_win:
+                symbol, count, payout = table.results[code]
+                payline = config.paylines[line_index]
+                wins.append({
+                    'symbol': symbol,
+                    'count': count,
+                    'payout': payout,
+                    'positions': payline[:count],
+                    'line': line_index,
+                    'line_positions': payline[:count]
+                })
+        
+        yield build_spin_result(config, board, wins, sim_id=start_id + i)
+
+def iter_compact_results(config: CompiledGameConfig, batch: Dict[str, np.ndarray], bet_amount: float = 1.0, start_id: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Expand a batch into compact per-spin results scaled by the bet.
+    
+    Only the board and the winning lines are kept, without the event list
+    of the full Stake Engine result.
+    
+    Args:
+        config: Game configuration
+        batch: Output of `run_spins_batch`
+        bet_amount: Bet per spin
+        start_id: Id of the first spin, usually its RNG counter (ids are None when omitted)
+    
+    Yields:
+        Dictionaries with id, board, wins and totalWin
+    """
+    table = config.payline_table
+    symbols = config.symbols
+    
+    for i, (board_ids, codes, mask, payout) in enumerate(zip(batch["boards"].tolist(), batch["line_codes"].tolist(), batch["win_mask"].tolist(), batch["payouts"].tolist())):
+        wins = []
+        for line_index, (code, is_win) in enumerate(zip(codes, mask)):
+            if is_win:
+                symbol, count, line_payout = table.results[code]
+                wins.append({
+                    "symbol": symbol,
+                    "kind": count,
+                    "win": line_payout * bet_amount,
+                    "positions": config.paylines[line_index][:count]
+                })
+        
+        yield {
+            "id": start_id + i if start_id is not None else None,
+            "board": [symbols[symbol_id] for symbol_id in board_ids],
+            "wins": wins,
+            "totalWin": payout * bet_amount
+        }
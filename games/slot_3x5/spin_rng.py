@@ -0,0 +1,228 @@
+"""
+Counter-based random numbers for spins.
+Every spin's reel stops are a pure function of (seed, stream, counter), so any
+spin can be regenerated on its own and workers can start at any counter.
+"""
+
+import os
+import secrets
+import threading
+import zlib
+from typing import List, NamedTuple, Sequence
+
+import numpy as np
+
+# Live play reads these; without a seed every process draws a fresh one
+SEED_ENV = "STAKE_RNG_SEED"
+STREAM_ENV = "STAKE_RNG_STREAM"
+
+# Drawn live seeds are appended here as "stream seed" lines, so stream:counter
+# keys stay replayable; the file predicts every spin, so it is kept private
+SEED_LOG_ENV = "STAKE_RNG_SEED_LOG"
+DEFAULT_SEED_LOG = "rng_seeds.log"
+
+# Bits of a freshly drawn live stream; results carry it as rngStream, so it
+# stays below 2^53 to survive JSON clients that parse numbers as doubles
+STREAM_BITS = 53
+
+# Philox4x64 gives four 64-bit words per counter; a spin takes one block
+# and uses its eight 32-bit halves (low half first) for the reel stops
+WORDS_PER_SPIN = 4
+
+class SpinKey(NamedTuple):
+    """Address of one spin, written as "seed:stream:counter"."""
+    seed: int
+    stream: int
+    counter: int
+    
+    def __str__(self) -> str:
+        return f"{self.seed}:{self.stream}:{self.counter}"
+    
+    @classmethod
+    def parse(cls, text: str) -> "SpinKey":
+        """
+        Parse "seed:stream:counter", or "stream:counter" with the seed from
+        STAKE_RNG_SEED or, failing that, the seed log (live results only
+        carry their stream and counter).
+        """
+        parts = [int(part) for part in text.split(":")]
+        if len(parts) == 2:
+            seed = os.environ.get(SEED_ENV)
+            seed = int(seed) if seed else logged_seed(parts[0])
+            if seed is None:
+                raise ValueError(f"Spin key {text!r} has no seed: {SEED_ENV} is not set and stream {parts[0]} is not in the seed log")
+            parts.insert(0, seed)
+        if len(parts) != 3:
+            raise ValueError(f"Spin key must be seed:stream:counter, got {text!r}")
+        return cls(*parts)
+
+def seed_log_path() -> str:
+    return os.environ.get(SEED_LOG_ENV, DEFAULT_SEED_LOG)
+
+def log_seed(seed: int, stream: int) -> None:
+    """Append a drawn live seed to the seed log, synced before any spin uses it."""
+    fd = os.open(seed_log_path(), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    with os.fdopen(fd, 'a') as f:
+        f.write(f"{stream} {seed}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def logged_seed(stream: int) -> int:
+    """Seed the seed log recorded for a live stream, or None."""
+    if not os.path.exists(seed_log_path()):
+        return None
+    
+    with open(seed_log_path(), 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2 and int(fields[0]) == stream:
+                return int(fields[1])
+    return None
+
+def mode_stream(mode: str) -> int:
+    """Stream of a game mode's simulations; their counters are simulation ids."""
+    return zlib.crc32(mode.encode())
+
+def _bounded(halves: Sequence[int], stop_counts: Sequence[int]) -> List[int]:
+    """
+    Map 32-bit values to stops in [0, n) without bias (Lemire's method).
+    
+    A value is rejected with probability below n / 2^32 and the next unused
+    half is taken instead.
+    """
+    stops = []
+    position = 0
+    for n in stop_counts:
+        while True:
+            if position == len(halves):
+                raise RuntimeError("Spin block exhausted by rejections")
+            product = halves[position] * n
+            position += 1
+            if (product & 0xFFFFFFFF) >= (1 << 32) % n:
+                stops.append(product >> 32)
+                break
+    return stops
+
+class CounterRNG:
+    """
+    Philox4x64-10 generator keyed by a seed, with spins addressed by counter.
+    
+    The Philox key is derived from the seed and the stream sits in the top
+    word of the 256-bit counter, so streams never overlap. Spin `c` is the
+    block at counter c + 1 (NumPy advances the counter before each block),
+    which makes a run of consecutive spins one sequential Philox stream.
+    """
+    
+    def __init__(self, seed: int = None, stream: int = 0, start: int = 0):
+        self.seed = secrets.randbits(64) if seed is None else seed
+        self.stream = stream
+        self._key = np.random.SeedSequence(self.seed).generate_state(2, np.uint64)
+        self._next = start
+        self._lock = threading.Lock()
+        # One bit generator per thread, repositioned for each spin
+        self._local = threading.local()
+    
+    def reserve(self, n: int = 1) -> int:
+        """Claim `n` consecutive counters and return the first."""
+        with self._lock:
+            start = self._next
+            self._next += n
+            return start
+    
+    def key(self, counter: int) -> SpinKey:
+        return SpinKey(self.seed, self.stream, counter)
+    
+    def _generator(self, counter: int) -> np.random.Philox:
+        return np.random.Philox(key=self._key, counter=[counter, 0, 0, self.stream])
+    
+    def words(self, counter: int) -> List[int]:
+        """The four 64-bit words of one spin."""
+        local = self._local
+        state = getattr(local, "state", None)
+        if state is None:
+            local.bit_generator = self._generator(0)
+            state = local.state = local.bit_generator.state
+        
+        # Setting the state is several times cheaper than a new Philox
+        state["state"]["counter"][0] = counter
+        state["buffer_pos"] = WORDS_PER_SPIN
+        local.bit_generator.state = state
+        return local.bit_generator.random_raw(WORDS_PER_SPIN).tolist()
+    
+    def stops(self, counter: int, stop_counts: Sequence[int]) -> List[int]:
+        """Reel stops of one spin."""
+        halves = []
+        for word in self.words(counter):
+            halves.append(word & 0xFFFFFFFF)
+            halves.append(word >> 32)
+        return _bounded(halves, stop_counts)
+    
+    def batch_stops(self, start: int, n: int, stop_counts: Sequence[int]) -> np.ndarray:
+        """
+        Reel stops of spins start .. start + n - 1, equal to `stops` for each.
+        
+        Returns:
+            Array of shape (reels, n)
+        """
+        words = self._generator(start).random_raw(WORDS_PER_SPIN * n).reshape(n, WORDS_PER_SPIN)
+        # Little-endian view puts each word's low half first, as in `stops`
+        halves = words.astype("<u8", copy=False).view("<u4")
+        
+        stops = np.empty((len(stop_counts), n), dtype=np.int32)
+        rejected = np.zeros(n, dtype=bool)
+        for reel, count in enumerate(stop_counts):
+            products = halves[:, reel] * np.uint64(count)
+            stops[reel] = products >> np.uint64(32)
+            rejected |= products.astype(np.uint32) < (1 << 32) % count
+        
+        # Rows with a rejected half take later halves; rare enough to redo one by one
+        for row in np.flatnonzero(rejected).tolist():
+            stops[:, row] = _bounded(halves[row].tolist(), stop_counts)
+        
+        return stops
+
+_default_rng = None
+_default_rng_lock = threading.Lock()
+
+def default_rng() -> CounterRNG:
+    """
+    Process-wide generator for live play.
+    
+    Seeded from STAKE_RNG_SEED when set (keep it secret: the seed predicts
+    every spin) and otherwise from OS entropy, in which case the drawn seed
+    is appended to the seed log (STAKE_RNG_SEED_LOG, default rng_seeds.log,
+    created owner-only) before the generator is handed out. The stream is
+    STAKE_RNG_STREAM when set, and otherwise drawn from OS entropy on every
+    start. Counters restart at 0, so a seeded process that reused its stream
+    would deal the same spins again; an explicit STAKE_RNG_STREAM must
+    therefore be unique per process start.
+    
+    Results carry their id and stream, so a live spin replays from its
+    "stream:counter" key with the seed taken from STAKE_RNG_SEED or the
+    seed log (see `SpinKey.parse`).
+    """
+    global _default_rng
+    
+    if _default_rng is not None:
+        return _default_rng
+    
+    with _default_rng_lock:
+        if _default_rng is None:
+            seed = os.environ.get(SEED_ENV)
+            stream = os.environ.get(STREAM_ENV)
+            rng = CounterRNG(
+                int(seed) if seed else None,
+                int(stream) if stream else secrets.randbits(STREAM_BITS)
+            )
+            if not seed:
+                log_seed(rng.seed, rng.stream)
+            _default_rng = rng
+    
+    return _default_rng
+
+def _reset_default_rng() -> None:
+    global _default_rng
+    _default_rng = None
+
+# A forked child must not replay its parent's counters
+os.register_at_fork(after_in_child=_reset_default_rng)
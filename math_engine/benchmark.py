@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the math engine hot paths.
+Measures spin generation, payline evaluation and output writers on fixed
+seeds and board corpora, and checks the results against a JSON baseline.
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# Add the games directory to path
+sys.path.append(str(Path(__file__).parent.parent / "games" / "slot_3x5"))
+
+from gamestate import run_spin, generate_board
+from game_config import CompiledGameConfig, load_config
+from paylines import check_paylines
+from spin_batch import run_spins_batch, iter_batch_results
+from spin_rng import CounterRNG
+from books import BooksWriter
+from lookup_columns import LookupColumnsWriter
+from slot_engine import handle_play_request
+
+# Fixed seeds so every run measures the same boards and outcomes
+BOARD_SEED = 20240601
+SPIN_SEED = 7
+BATCH_SEED = 11
+
+# Corpus sizes; large enough for stable timings, small enough for CI
+CORPUS_SIZE = 2000
+BOOKS_CORPUS_SIZE = 20000
+BATCH_SPINS = 200000
+
+# Metric is a regression when it is this much worse than the baseline
+DEFAULT_THRESHOLD = 0.2
+
+def best_time(function: Callable[[], Any], repeat: int = 5) -> float:
+    """Fastest of `repeat` runs, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def board_corpus(config: CompiledGameConfig, size: int = CORPUS_SIZE) -> List[List[str]]:
+    """Fixed corpus of boards drawn with BOARD_SEED."""
+    rng = CounterRNG(BOARD_SEED)
+    return [generate_board(config, rng, counter) for counter in range(size)]
+
+def metric(value: float, unit: str, higher_is_better: bool = True) -> Dict[str, Any]:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+def bench_generate_board(config: CompiledGameConfig) -> Dict[str, Any]:
+    rng = CounterRNG(SPIN_SEED)
+    
+    def run():
+        for counter in range(CORPUS_SIZE):
+            generate_board(config, rng, counter)
+    return metric(CORPUS_SIZE / best_time(run), "boards/s")
+
+def bench_check_paylines(config: CompiledGameConfig, boards: List[List[str]]) -> Dict[str, Any]:
+    paylines = config.paylines
+    paytable = config.paytable
+    table = config.payline_table
+    
+    def run():
+        for board in boards:
+            check_paylines(board, paylines, paytable, table)
+    evaluations = len(boards) * len(paylines)
+    return metric(best_time(run) / evaluations * 1e9, "ns/payline", higher_is_better=False)
+
+def bench_run_spin(config: CompiledGameConfig) -> Dict[str, Any]:
+    rng = CounterRNG(SPIN_SEED)
+    
+    def run():
+        for counter in range(CORPUS_SIZE):
+            run_spin(config, rng, counter)
+    return metric(CORPUS_SIZE / best_time(run), "spins/s")
+
+def bench_handle_play_request(config: CompiledGameConfig) -> Dict[str, Any]:
+    def run():
+        for _ in range(CORPUS_SIZE):
+            handle_play_request(1.0, config)
+    return metric(CORPUS_SIZE / best_time(run), "spins/s")
+
+def bench_run_spins_batch(config: CompiledGameConfig) -> Dict[str, Any]:
+    def run():
+        run_spins_batch(config, BATCH_SPINS, CounterRNG(BATCH_SEED), start_counter=0)
+    return metric(BATCH_SPINS / best_time(run), "spins/s")
+
+def books_corpus(config: CompiledGameConfig) -> List[str]:
+    """Fixed corpus of serialised books lines."""
+    batch = run_spins_batch(config, BOOKS_CORPUS_SIZE, np.random.default_rng(BATCH_SEED))
+    return [json.dumps(result) + '\n' for result in iter_batch_results(config, batch, 1)]
+
+def bench_books_jsonl_gz(lines: List[str]) -> Dict[str, Any]:
+    data = ''.join(lines).encode()
+    
+    def run():
+        with gzip.GzipFile(fileobj=io.BytesIO(), mode='wb', mtime=0) as f:
+            for line in lines:
+                f.write(line.encode())
+    return metric(len(data) / best_time(run, repeat=3) / 1e6, "MB/s")
+
+def bench_books_blocks(lines: List[str], directory: str) -> Dict[str, Any]:
+    size = sum(len(line) for line in lines)
+    path = os.path.join(directory, "bench.books")
+    
+    def run():
+        with BooksWriter(path) as writer:
+            for sim_id, line in enumerate(lines, 1):
+                writer.write_line(sim_id, line)
+    return metric(size / best_time(run, repeat=3) / 1e6, "MB/s")
+
+def bench_lookup_columns(config: CompiledGameConfig, directory: str) -> Dict[str, Any]:
+    batch = run_spins_batch(config, BATCH_SPINS, np.random.default_rng(BATCH_SEED))
+    ids = np.arange(1, BATCH_SPINS + 1)
+    weights = np.ones(BATCH_SPINS, dtype=np.int64)
+    criteria = ["basegame"] * BATCH_SPINS
+    path = os.path.join(directory, "lookUpTable_bench.csv")
+    
+    def run():
+        with LookupColumnsWriter(path) as writer:
+            writer.append(ids, weights, batch["payouts"], criteria)
+    return metric(BATCH_SPINS / best_time(run) / 1e6, "M rows/s")
+
+def run_benchmarks() -> Dict[str, Dict[str, Any]]:
+    """Run every benchmark and return its metric."""
+    config = load_config()
+    boards = board_corpus(config)
+    lines = books_corpus(config)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = {
+            "generate_board": lambda: bench_generate_board(config),
+            "check_paylines": lambda: bench_check_paylines(config, boards),
+            "run_spin": lambda: bench_run_spin(config),
+            "handle_play_request": lambda: bench_handle_play_request(config),
+            "run_spins_batch": lambda: bench_run_spins_batch(config),
+            "books_jsonl_gz": lambda: bench_books_jsonl_gz(lines),
+            "books_blocks": lambda: bench_books_blocks(lines, directory),
+            "lookup_columns": lambda: bench_lookup_columns(config, directory)
+        }
+        for name, benchmark in benchmarks.items():
+            results[name] = benchmark()
+            print(f"{name:22s} {results[name]['value']:14.2f} {results[name]['unit']}")
+    
+    return results
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Find metrics that regressed beyond `threshold` (a fraction of the baseline).
+    
+    Returns:
+        Description of each regression; empty when none regressed
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results:
+            continue
+        value = results[name]["value"]
+        if base["higher_is_better"]:
+            regressed = value < base["value"] * (1 - threshold)
+        else:
+            regressed = value > base["value"] * (1 + threshold)
+        if regressed:
+            change = (value - base["value"]) / base["value"] * 100
+            regressions.append(f"{name}: {value:.2f} {base['unit']} vs baseline {base['value']:.2f} ({change:+.1f}%)")
+    return regressions
+
+def main():
+    """Run the suite, optionally saving or checking a baseline."""
+    args = sys.argv[1:]
+    if not args or args[0] != "run":
+        print("Usage: python benchmark.py run [--save baseline.json] [--compare baseline.json] [--threshold 0.2]")
+        sys.exit(1)
+    
+    options = dict(zip(args[1::2], args[2::2]))
+    threshold = float(options.get("--threshold", DEFAULT_THRESHOLD))
+    
+    results = run_benchmarks()
+    
+    if "--save" in options:
+        with open(options["--save"], 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {options['--save']}")
+    
+    if "--compare" in options:
+        with open(options["--compare"], 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, threshold)
+        if regressions:
+            print(f"Regressions beyond {threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {threshold:.0%} against {options['--compare']}")
+
+if __name__ == "__main__":
+    main()
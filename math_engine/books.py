@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Random-access books format for Stake Engine outcomes.
+Stores books as independently compressed blocks with a sidecar id index.
+"""
+
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Index layout: header, then one (offset, length) entry per block. Records
+# are consecutive simulation ids, so the block holding an id is found by
+# arithmetic and each lookup reads one index entry and one block.
+INDEX_MAGIC = b"STKBKIX1"
+INDEX_HEADER = struct.Struct("<8sQQI")    # magic, first_id, record_count, block_records
+INDEX_ENTRY = struct.Struct("<QI")        # block offset, compressed length
+
+# Each block starts with its record count and the byte length of every
+# record, followed by the newline-terminated JSON records themselves.
+BLOCK_COUNT = struct.Struct("<I")
+
+class BooksWriter:
+    """
+    Write books as compressed blocks of `block_records` consecutive records.
+    
+    Records must arrive in ascending, consecutive simulation id order.
+    `resume` takes a `checkpoint()` state and carries on writing after it.
+    """
+    
+    def __init__(self, path: str, block_records: int = 64, level: int = 6, resume: Dict[str, Any] = None):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.block_records = block_records
+        self.level = level
+        self.first_id = None
+        self.record_count = 0
+        self._lines: List[bytes] = []
+        self._offset = 0
+        
+        if resume is None:
+            self._data = open(path, 'wb')
+            self._index = open(self.index_path, 'wb')
+            self._index.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, block_records))
+            return
+        
+        self.first_id = resume["first_id"]
+        self.record_count = resume["record_count"]
+        self._lines = [line.encode() for line in resume["pending"]]
+        self._offset = resume["offset"]
+        # Drop blocks written after the checkpoint; the header is rewritten on close
+        blocks = (self.record_count - len(self._lines)) // block_records
+        os.truncate(path, self._offset)
+        os.truncate(self.index_path, INDEX_HEADER.size + blocks * INDEX_ENTRY.size)
+        self._data = open(path, 'ab')
+        self._index = open(self.index_path, 'r+b')
+        self._index.seek(0, os.SEEK_END)
+    
+    def write_record(self, record: Dict[str, Any]) -> None:
+        """Append one outcome."""
+        self.write_line(record["id"], json.dumps(record) + '\n')
+    
+    def write_line(self, sim_id: int, line: str) -> None:
+        """Append one outcome that is already serialised as a JSON line."""
+        if self.first_id is None:
+            self.first_id = sim_id
+        elif sim_id != self.first_id + self.record_count:
+            raise ValueError(f"Expected simulation id {self.first_id + self.record_count}, got {sim_id}")
+        
+        self._lines.append(line.encode())
+        self.record_count += 1
+        
+        if len(self._lines) == self.block_records:
+            self._flush_block()
+    
+    def _flush_block(self) -> None:
+        if not self._lines:
+            return
+        
+        lengths = struct.pack(f"<{len(self._lines)}I", *(len(line) for line in self._lines))
+        block = zlib.compress(BLOCK_COUNT.pack(len(self._lines)) + lengths + b''.join(self._lines), self.level)
+        
+        self._data.write(block)
+        self._index.write(INDEX_ENTRY.pack(self._offset, len(block)))
+        self._offset += len(block)
+        self._lines = []
+    
+    def checkpoint(self) -> Dict[str, Any]:
+        """
+        Sync the written blocks to disk and return the state to resume from.
+        
+        Records of the unfinished block are kept in the state rather than
+        flushed, so a resumed file is identical to an uninterrupted one.
+        """
+        for f in (self._data, self._index):
+            f.flush()
+            os.fsync(f.fileno())
+        return {
+            "first_id": self.first_id,
+            "record_count": self.record_count,
+            "offset": self._offset,
+            "pending": [line.decode() for line in self._lines]
+        }
+    
+    def close(self) -> None:
+        """Flush the last block and finalise the index header."""
+        self._flush_block()
+        self._index.seek(0)
+        self._index.write(INDEX_HEADER.pack(INDEX_MAGIC, self.first_id or 0, self.record_count, self.block_records))
+        self._data.close()
+        self._index.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class BooksReader:
+    """
+    Constant-time access to books written by BooksWriter.
+    
+    Reads use os.pread, so one reader can be shared between threads and
+    ranges can be fetched in parallel.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        
+        with open(path + ".idx", 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, self.first_id, self.record_count, self.block_records = INDEX_HEADER.unpack_from(self._index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Not a books index: {path}.idx")
+        
+        self._cached_block: Tuple[int, List[bytes]] = (-1, [])
+    
+    def __len__(self) -> int:
+        return self.record_count
+    
+    def _read_block(self, block_index: int) -> List[bytes]:
+        cached_index, cached_lines = self._cached_block
+        if cached_index == block_index:
+            return cached_lines
+        
+        offset, length = INDEX_ENTRY.unpack_from(self._index, INDEX_HEADER.size + block_index * INDEX_ENTRY.size)
+        raw = zlib.decompress(os.pread(self._fd, length, offset))
+        
+        (count,) = BLOCK_COUNT.unpack_from(raw, 0)
+        lengths = struct.unpack_from(f"<{count}I", raw, BLOCK_COUNT.size)
+        position = BLOCK_COUNT.size + 4 * count
+        lines = []
+        for line_length in lengths:
+            lines.append(raw[position:position + line_length])
+            position += line_length
+        
+        self._cached_block = (block_index, lines)
+        return lines
+    
+    def get_line(self, sim_id: int) -> bytes:
+        """Raw JSON line for a simulation id."""
+        position = sim_id - self.first_id
+        if position < 0 or position >= self.record_count:
+            raise KeyError(sim_id)
+        
+        block_index, line_index = divmod(position, self.block_records)
+        return self._read_block(block_index)[line_index]
+    
+    def get(self, sim_id: int) -> Dict[str, Any]:
+        """Outcome for a simulation id."""
+        return json.loads(self.get_line(sim_id))
+    
+    def iter_lines(self, start_id: int = None, end_id: int = None) -> Iterator[bytes]:
+        """Raw JSON lines for ids in [start_id, end_id), block by block."""
+        start = max(0, (start_id if start_id is not None else self.first_id) - self.first_id)
+        end = min(self.record_count, (end_id if end_id is not None else self.first_id + self.record_count) - self.first_id)
+        
+        position = start
+        while position < end:
+            block_index, line_index = divmod(position, self.block_records)
+            lines = self._read_block(block_index)
+            take = min(len(lines) - line_index, end - position)
+            yield from lines[line_index:line_index + take]
+            position += take
+    
+    def get_range(self, start_id: int, end_id: int) -> List[Dict[str, Any]]:
+        """Outcomes for ids in [start_id, end_id)."""
+        return [json.loads(line) for line in self.iter_lines(start_id, end_id)]
+    
+    def get_ranges_parallel(self, ranges: List[Tuple[int, int]], max_workers: int = None) -> List[List[Dict[str, Any]]]:
+        """Read several [start_id, end_id) ranges concurrently, one reader per range."""
+        def read_range(id_range: Tuple[int, int]) -> List[Dict[str, Any]]:
+            with BooksReader(self.path) as reader:
+                return reader.get_range(*id_range)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(read_range, ranges))
+    
+    def close(self) -> None:
+        """Release the index map and data file."""
+        self._index.close()
+        os.close(self._fd)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def export_jsonl(books_path: str, output_file: str) -> None:
+    """Export blocked books to the plain (optionally gzipped) JSONL format."""
+    opener = gzip.open if output_file.endswith(".gz") else open
+    
+    with BooksReader(books_path) as reader, opener(output_file, 'wb') as f:
+        for line in reader.iter_lines():
+            f.write(line)
+    
+    print(f"Exported {books_path} to {output_file}")
+
+def main():
+    """Command line access to blocked books."""
+    if len(sys.argv) < 3:
+        print("Usage: python books.py get <books_file> <simulation_id>")
+        print("       python books.py export <books_file> <output.jsonl[.gz]>")
+        sys.exit(1)
+    
+    command = sys.argv[1]
+    
+    if command == "get" and len(sys.argv) > 3:
+        with BooksReader(sys.argv[2]) as reader:
+            print(reader.get_line(int(sys.argv[3])).decode(), end='')
+    
+    elif command == "export" and len(sys.argv) > 3:
+        export_jsonl(sys.argv[2], sys.argv[3])
+    
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
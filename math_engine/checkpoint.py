@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for long simulation runs.
+A run periodically records how far its output files got and its partial
+statistics, so a restart with the same parameters resumes from there.
+"""
+
+import json
+import os
+from typing import Any, Dict, IO, Optional
+
+class Checkpoint:
+    """
+    One run's checkpoint file, replaced atomically on every save.
+    
+    `params` identify the run: a checkpoint is only resumed by a run with
+    the same params. A None param matches any saved value, so a run without
+    an explicit seed picks up the seed of the run it resumes.
+    """
+    
+    def __init__(self, path: str, params: Dict[str, Any]):
+        self.path = path
+        # Compared after a JSON round trip, as they are stored
+        self.params = json.loads(json.dumps(params))
+    
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Saved state of a matching run, or None to start afresh."""
+        if not os.path.exists(self.path):
+            return None
+        
+        with open(self.path, 'r') as f:
+            state = json.load(f)
+        
+        saved = state.get("params", {})
+        if any(value is not None and saved.get(key) != value for key, value in self.params.items()):
+            print(f"Ignoring checkpoint {self.path}: it was written with different parameters")
+            return None
+        
+        for key, value in saved.items():
+            if self.params.get(key) is None:
+                self.params[key] = value
+        return state
+    
+    def save(self, state: Dict[str, Any]) -> None:
+        """
+        Write `state` with the run's params.
+        
+        Output files must already be synced (see `sync_position`), so the
+        checkpoint never points past data that a crash could lose.
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"params": self.params, **state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    def remove(self) -> None:
+        """Drop the checkpoint once the run has finished."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def sync_position(f: IO) -> int:
+    """Flush an output file to disk and return its length so far."""
+    f.flush()
+    os.fsync(f.fileno())
+    return f.tell()
+
+def reopen_at(path: str, position: int, mode: str = 'ab', **kwargs) -> IO:
+    """
+    Truncate a file to a checkpointed length and open it for appending.
+    
+    Anything written after the checkpoint is discarded, so appending
+    continues exactly where the checkpoint left off.
+    """
+    os.truncate(path, position)
+    return open(path, mode, **kwargs)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Columnar lookup tables for Stake Engine math tooling.
+Stores lookup tables as typed binary columns that load as memory maps.
+"""
+
+import csv
+import itertools
+import json
+import os
+import sys
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# A table lookUpTable_base.csv is stored as lookUpTable_base.columns/, one raw
+# little-endian file per column plus meta.json with the row count and the
+# criteria names that the criteria codes index.
+COLUMNS_FORMAT = "stake-lookup-columns-1"
+COLUMN_DTYPES = {
+    "simulation_id": np.dtype("<i8"),
+    "weight": np.dtype("<i8"),
+    "payout": np.dtype("<f8"),
+    "criteria": np.dtype("<u2")
+}
+
+@dataclass(frozen=True)
+class LookupColumns:
+    """
+    A lookup table as parallel arrays, usually memory-mapped from disk.
+    
+    `criteria` holds codes into `criteria_names`.
+    """
+    simulation_id: np.ndarray
+    weight: np.ndarray
+    payout: np.ndarray
+    criteria: np.ndarray
+    criteria_names: List[str]
+    
+    def __len__(self) -> int:
+        return len(self.simulation_id)
+    
+    def with_weights(self, weights: np.ndarray) -> "LookupColumns":
+        """Same outcomes with new weights."""
+        return replace(self, weight=np.asarray(weights, dtype=COLUMN_DTYPES["weight"]))
+
+def columns_path(csv_path: str) -> str:
+    """Column directory stored next to a lookup table CSV."""
+    return str(Path(csv_path).with_suffix(".columns"))
+
+def criteria_csv_path(csv_path: str) -> str:
+    """Criteria mapping run.py writes for a lookup table (optimized or not)."""
+    path = Path(csv_path)
+    mode = path.stem.replace("lookUpTable_", "", 1).replace("_optimized", "")
+    return str(path.with_name(f"lookUpTableIdToCriteria_{mode}.csv"))
+
+class LookupColumnsWriter:
+    """
+    Append lookup-table rows to a column directory.
+    
+    Rows are written as they arrive, so tables of any size are built with
+    constant memory. `resume` takes a `checkpoint()` state and appends
+    after the rows it covers.
+    """
+    
+    def __init__(self, csv_path: str, criteria_names: Sequence[str] = (), resume: Dict[str, Any] = None):
+        self.path = columns_path(csv_path)
+        self.rows = 0 if resume is None else resume["rows"]
+        self.criteria_names: List[str] = list(criteria_names if resume is None else resume["criteria_names"])
+        self._criteria_codes: Dict[str, int] = {name: code for code, name in enumerate(self.criteria_names)}
+        
+        os.makedirs(self.path, exist_ok=True)
+        # A missing meta.json marks the directory as incomplete
+        if os.path.exists(os.path.join(self.path, "meta.json")):
+            os.remove(os.path.join(self.path, "meta.json"))
+        
+        if resume is None:
+            self._files = {name: open(os.path.join(self.path, f"{name}.bin"), 'wb') for name in COLUMN_DTYPES}
+            return
+        
+        self._files = {}
+        for name, dtype in COLUMN_DTYPES.items():
+            column_file = os.path.join(self.path, f"{name}.bin")
+            os.truncate(column_file, self.rows * dtype.itemsize)
+            self._files[name] = open(column_file, 'ab')
+    
+    def append(self, simulation_ids: Sequence[int], weights: Sequence[int], payouts: Sequence[float], criteria: Sequence[str]) -> None:
+        """Append rows given as parallel sequences."""
+        codes = [self._criteria_codes.get(name) for name in criteria]
+        if None in codes:
+            for name in criteria:
+                if name not in self._criteria_codes:
+                    self._criteria_codes[name] = len(self.criteria_names)
+                    self.criteria_names.append(name)
+            codes = [self._criteria_codes[name] for name in criteria]
+        
+        self.append_codes(simulation_ids, weights, payouts, codes)
+    
+    def append_codes(self, simulation_ids: Sequence[int], weights: Sequence[int], payouts: Sequence[float], criteria_codes: Sequence[int]) -> None:
+        """Append rows whose criteria are already codes into `criteria_names`."""
+        columns = {
+            "simulation_id": simulation_ids,
+            "weight": weights,
+            "payout": payouts,
+            "criteria": criteria_codes
+        }
+        for name, values in columns.items():
+            np.asarray(values, dtype=COLUMN_DTYPES[name]).tofile(self._files[name])
+        
+        self.rows += len(criteria_codes)
+    
+    def append_rows(self, lookup_rows: Sequence[Sequence[Any]], criteria_rows: Sequence[Sequence[Any]]) -> None:
+        """Append rows in the lookup table and criteria CSV row layouts."""
+        if not lookup_rows:
+            return
+        simulation_ids, weights, payouts = zip(*lookup_rows)
+        self.append(simulation_ids, weights, payouts, [row[1] for row in criteria_rows])
+    
+    def checkpoint(self) -> Dict[str, Any]:
+        """Sync the columns to disk and return the state to resume from."""
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        return {"rows": self.rows, "criteria_names": list(self.criteria_names)}
+    
+    def close(self) -> None:
+        """Close the column files and write meta.json."""
+        self._close_files()
+        
+        meta = {
+            "format": COLUMNS_FORMAT,
+            "rows": self.rows,
+            "columns": {name: dtype.str for name, dtype in COLUMN_DTYPES.items()},
+            "criteria_names": self.criteria_names
+        }
+        with open(os.path.join(self.path, "meta.json"), 'w') as f:
+            json.dump(meta, f, indent=2)
+    
+    def _close_files(self) -> None:
+        for f in self._files.values():
+            f.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, *exc):
+        # A failed write leaves the directory without meta.json
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()
+
+def write_lookup_columns(csv_path: str, table: LookupColumns, chunk_size: int = 1 << 22) -> None:
+    """Write a whole table as the column directory for `csv_path`."""
+    with LookupColumnsWriter(csv_path, table.criteria_names) as writer:
+        for start in range(0, len(table), chunk_size):
+            end = start + chunk_size
+            writer.append_codes(
+                table.simulation_id[start:end],
+                table.weight[start:end],
+                table.payout[start:end],
+                table.criteria[start:end]
+            )
+
+def write_lookup_csv(csv_path: str, table: LookupColumns, chunk_size: int = 1 << 20) -> None:
+    """Write a table as a lookup table CSV, in the format run.py produces."""
+    with open(csv_path, 'w', newline='') as f:
+        f.write('simulation_id,weight,payout_multiplier\r\n')
+        
+        for start in range(0, len(table), chunk_size):
+            end = start + chunk_size
+            rows = zip(table.simulation_id[start:end].tolist(), table.weight[start:end].tolist(), table.payout[start:end].tolist())
+            f.write(''.join(f"{sim_id},{weight},{payout}\r\n" for sim_id, weight, payout in rows))
+
+def save_lookup_table(csv_path: str, table: LookupColumns) -> None:
+    """Write a table as both its CSV and its column directory."""
+    write_lookup_csv(csv_path, table)
+    write_lookup_columns(csv_path, table)
+
+def convert_lookup_csv(csv_path: str, criteria_path: str = None, chunk_size: int = 1 << 20) -> None:
+    """
+    Build the column directory for an existing lookup table CSV.
+    
+    The CSV is parsed in chunks. Criteria come from the matching criteria CSV
+    when it exists (rows must be in the same order); otherwise every row is
+    given the criteria "unknown".
+    
+    Raises:
+        ValueError: If the criteria CSV does not line up with the lookup table
+    """
+    criteria_path = criteria_path or criteria_csv_path(csv_path)
+    criteria_file = open(criteria_path, 'r', newline='') if os.path.exists(criteria_path) else None
+    
+    try:
+        criteria_rows = None
+        if criteria_file:
+            criteria_rows = csv.reader(criteria_file)
+            next(criteria_rows, None)
+        
+        with open(csv_path, 'r') as f, LookupColumnsWriter(csv_path) as writer:
+            f.readline()
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+                
+                chunk = np.loadtxt(lines, delimiter=',', dtype=np.float64, ndmin=2)
+                simulation_ids = chunk[:, 0].astype(np.int64)
+                
+                if criteria_rows is not None:
+                    rows = list(itertools.islice(criteria_rows, len(lines)))
+                    if len(rows) != len(lines) or any(int(row[0]) != sim_id for row, sim_id in zip(rows, simulation_ids.tolist())):
+                        raise ValueError(f"{criteria_path} does not match the rows of {csv_path}")
+                    criteria = [row[1] for row in rows]
+                else:
+                    criteria = ["unknown"] * len(lines)
+                
+                writer.append(simulation_ids, chunk[:, 1].astype(np.int64), chunk[:, 2], criteria)
+    finally:
+        if criteria_file:
+            criteria_file.close()
+
+def load_lookup_columns(csv_path: str) -> LookupColumns:
+    """
+    Memory-map the columns of a lookup table.
+    
+    The column directory is built from the CSV first if it is missing,
+    incomplete or older than the CSV.
+    
+    Args:
+        csv_path: Path of the lookup table CSV
+    
+    Returns:
+        LookupColumns backed by read-only memory maps
+    """
+    path = columns_path(csv_path)
+    meta_path = os.path.join(path, "meta.json")
+    
+    if not os.path.exists(meta_path) or (
+        os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(meta_path)
+    ):
+        convert_lookup_csv(csv_path)
+    
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    if meta.get("format") != COLUMNS_FORMAT:
+        raise ValueError(f"Not a lookup column directory: {path}")
+    
+    columns = {}
+    for name, dtype in meta["columns"].items():
+        if meta["rows"] == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+        else:
+            columns[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode='r', shape=(meta["rows"],))
+    
+    return LookupColumns(criteria_names=meta["criteria_names"], **columns)
+
+def main():
+    """Build the column directory for lookup table CSVs."""
+    if len(sys.argv) < 2:
+        print("Usage: python lookup_columns.py <lookup_table_file> [...]")
+        sys.exit(1)
+    
+    for csv_path in sys.argv[1:]:
+        convert_lookup_csv(csv_path)
+        print(f"Wrote {columns_path(csv_path)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Lookup-table play mode for Stake Engine compliance.
+Serves pre-generated outcomes drawn by their optimized lookup-table weights.
+"""
+
+import csv
+import gzip
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from books import BooksReader
+
+class AliasSampler:
+    """
+    Walker alias table for O(1) draws from integer weights.
+    
+    Built with Vose's method in exact integer arithmetic: every column holds
+    `total_weight` units split between its own index and one alias, so each
+    index is drawn with probability exactly weight / total_weight.
+    """
+    
+    def __init__(self, weights: Sequence[int]):
+        self.size = len(weights)
+        self.total_weight = sum(weights)
+        if self.size == 0 or self.total_weight <= 0:
+            raise ValueError("Alias table needs at least one positive weight")
+        
+        scaled = [int(weight) * self.size for weight in weights]
+        self.threshold = [self.total_weight] * self.size
+        self.alias = list(range(self.size))
+        
+        small = [i for i, value in enumerate(scaled) if value < self.total_weight]
+        large = [i for i, value in enumerate(scaled) if value >= self.total_weight]
+        
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            
+            self.threshold[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= self.total_weight - scaled[less]
+            
+            if scaled[more] < self.total_weight:
+                small.append(more)
+            else:
+                large.append(more)
+    
+    def sample(self, rng: random.Random) -> int:
+        """Draw one index."""
+        column = rng.randrange(self.size)
+        if rng.randrange(self.total_weight) < self.threshold[column]:
+            return column
+        return self.alias[column]
+
+class LookupTablePlayer:
+    """
+    Draw outcomes by lookup-table weight and return the matching book.
+    
+    Books are read from the random-access format when `books_path` ends in
+    `.books`; JSONL books are loaded into memory keyed by simulation id.
+    """
+    
+    def __init__(self, lookup_table_path: str, books_path: str, rng: random.Random = None):
+        self.lookup_table_path = lookup_table_path
+        self.books_path = books_path
+        self.rng = rng or random.SystemRandom()
+        
+        self.simulation_ids: List[int] = []
+        weights = []
+        with open(lookup_table_path, 'r') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                self.simulation_ids.append(int(row['simulation_id']))
+                weights.append(int(float(row['weight'])))
+        
+        self.sampler = AliasSampler(weights)
+        
+        if books_path.endswith(".books"):
+            self._reader = BooksReader(books_path)
+            self._books = None
+        else:
+            opener = gzip.open if books_path.endswith(".gz") else open
+            with opener(books_path, 'rt') as f:
+                self._books = {}
+                for line in f:
+                    self._books[json.loads(line)["id"]] = line
+            self._reader = None
+    
+    def get_book(self, sim_id: int) -> Dict[str, Any]:
+        """Fresh copy of the book for a simulation id."""
+        if self._reader is not None:
+            return self._reader.get(sim_id)
+        return json.loads(self._books[sim_id])
+    
+    def draw(self) -> Dict[str, Any]:
+        """Draw one outcome by weight (unscaled)."""
+        return self.get_book(self.simulation_ids[self.sampler.sample(self.rng)])
+
+def default_paths(mode: str = "base", library_dir: str = "library") -> Dict[str, str]:
+    """Optimized lookup table and books written by run.py for a mode."""
+    library = Path(library_dir)
+    books = library / "books" / f"books_{mode}.books"
+    if not books.exists():
+        books = library / "books" / f"books_{mode}.jsonl.gz"
+    
+    return {
+        "lookup_table": str(library / "lookup_tables" / f"lookUpTable_{mode}_optimized.csv"),
+        "books": str(books)
+    }
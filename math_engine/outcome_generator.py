@@ -11,25 +11,79 @@ import gzip
 import os
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, BinaryIO, TextIO
+
+import numpy as np
 
 # Add the games directory to path
 sys.path.append(str(Path(__file__).parent.parent / "games" / "slot_3x5"))
 
 from gamestate import run_spin
-from game_config import GameConfig
+from game_config import CompiledGameConfig, load_config
+from spin_batch import run_spins_batch, iter_batch_results, evaluate_boards
+from spin_rng import CounterRNG, mode_stream
+from books import BooksWriter
+from lookup_columns import LookupColumnsWriter
+from sim_stats import PayoutStats
+from checkpoint import Checkpoint, sync_position, reopen_at
+from rtp_calculator import iter_window_combinations
+
+# Outcomes per generated batch, books gzip member and lookup columns chunk;
+# streaming checkpoints fall on multiples of it
+BATCH_SIZE = 10000
+
+# Payout multiplier of the top win level (see gamestate.get_win_level)
+BIG_WIN_MULTIPLIER = 100
+
+def five_of_a_kind(symbol: str) -> Callable[[CompiledGameConfig, Dict[str, np.ndarray]], np.ndarray]:
+    """Criterion met by boards with a winning line of five `symbol`."""
+    def criterion(config: CompiledGameConfig, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        codes = np.array([
+            result is not None and result[0] == symbol and result[1] == config.reels
+            for result in config.payline_table.results
+        ])
+        return codes[batch["line_codes"]].any(axis=1)
+    return criterion
+
+# Criteria of targeted generation in priority order. A board belongs to the
+# first criterion it meets, so the criteria split the outcome space and
+# "basegame" takes whatever is left. Each maps a scored batch to a mask.
+TARGET_CRITERIA = {
+    "wincap": lambda config, batch: batch["payouts"] >= config.max_win_multiplier,
+    "surge5": five_of_a_kind("SURGE"),
+    "bigwin": lambda config, batch: batch["payouts"] >= BIG_WIN_MULTIPLIER,
+    "basegame": lambda config, batch: np.ones(len(batch["payouts"]), dtype=bool)
+}
+
+# Outcomes generated per criterion unless overridden
+DEFAULT_CRITERIA_QUOTAS = {
+    "wincap": 100,
+    "surge5": 1000,
+    "bigwin": 10000,
+    "basegame": 100000
+}
 
-def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None:
+def generate_outcomes(num_simulations: int, output_dir: str = "library", streaming: bool = False, seed: int = None, blocked_books: bool = False, checkpoint_every: int = 0) -> None:
     """
     Generate pre-calculated outcomes for Stake Engine.
     
     Args:
         num_simulations: Number of simulations to generate
         output_dir: Directory to store output files
+        streaming: Write every file incrementally in one pass with bounded memory
+        seed: RNG seed (None draws a fresh seed); simulation id i is the
+            spin at counter i of the "base" stream in either mode
+        blocked_books: Also write random-access books (books_base.books + .idx)
+        checkpoint_every: Outcomes between checkpoints when streaming (0 disables)
     """
+    if streaming:
+        generate_outcomes_streaming(num_simulations, output_dir, seed, blocked_books, checkpoint_every)
+        return
+    
     print(f"Generating {num_simulations} outcomes...")
     
-    config = GameConfig()
+    config = load_config()
+    rng = CounterRNG(seed, mode_stream("base"))
     
     # Create output directories
     books_dir = Path(output_dir) / "books"
@@ -45,8 +99,7 @@ def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None
     lookup_data = []
     
     for sim_id in range(1, num_simulations + 1):
-        result = run_spin(config)
-        result["id"] = sim_id
+        result = run_spin(config, rng, sim_id)
         
         outcomes.append(result)
         lookup_data.append({
@@ -67,6 +120,14 @@ def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None
     
     print(f"Written books file: {books_file}")
     
+    if blocked_books:
+        blocks_file = books_dir / "books_base.books"
+        with BooksWriter(str(blocks_file)) as writer:
+            for outcome in outcomes:
+                writer.write_record(outcome)
+        
+        print(f"Written blocked books file: {blocks_file}")
+    
     # Write lookup table
     lookup_file = lookup_dir / "lookUpTable_base.csv"
     with open(lookup_file, 'w', newline='') as f:
@@ -93,6 +154,16 @@ def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None
     
     print(f"Written criteria mapping: {criteria_file}")
     
+    with LookupColumnsWriter(str(lookup_file)) as writer:
+        writer.append(
+            [data["simulation_id"] for data in lookup_data],
+            [data["weight"] for data in lookup_data],
+            [data["payout_multiplier"] for data in lookup_data],
+            [data["criteria"] for data in lookup_data]
+        )
+    
+    print(f"Written lookup columns: {writer.path}")
+    
     # Generate statistics
     total_payout = sum(data["payout_multiplier"] for data in lookup_data)
     winning_outcomes = len([d for d in lookup_data if d["payout_multiplier"] > 0])
@@ -100,7 +171,29 @@ def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None
     rtp = (total_payout / num_simulations) * 100
     hit_frequency = (winning_outcomes / num_simulations) * 100
     
-    # Write index file
+    stats = PayoutStats()
+    stats.update_batch(np.array([data["payout_multiplier"] for data in lookup_data], dtype=np.float64))
+    
+    index_file = write_index(publish_dir, config, num_simulations, rtp, hit_frequency, blocked_books, stats, seed=rng.seed, stream_name="base")
+    
+    print(f"Written index file: {index_file}")
+    print(f"Statistics:")
+    print(f"  RTP: {rtp:.2f}%")
+    print(f"  Hit Frequency: {hit_frequency:.2f}%")
+    print(f"  Total Outcomes: {num_simulations}")
+    print(f"  Winning Outcomes: {winning_outcomes}")
+
+def write_index(publish_dir: Path, config: CompiledGameConfig, num_simulations: int, rtp: float, hit_frequency: float, blocked_books: bool = False, stats: PayoutStats = None, total_weight: int = None, criteria: Dict[str, Dict[str, Any]] = None, seed: int = None, stream_name: str = None) -> Path:
+    """
+    Write the publish index describing the generated files.
+    
+    `total_weight` marks weighted books: exact ones, whose outcomes carry the
+    number of stop combinations that produce them instead of weight 1, or
+    criteria-targeted ones, described per criterion by `criteria`.
+    
+    Sampled books pass their `seed` and RNG `stream_name`; outcome id i then
+    replays with spin key seed:mode_stream(stream_name):i.
+    """
     index_data = {
         "game_name": "3x5 Slot Game",
         "version": "1.0",
@@ -116,35 +209,590 @@ def generate_outcomes(num_simulations: int, output_dir: str = "library") -> None
             "reels": config.reels,
             "rows": config.rows,
             "paylines": len(config.paylines),
-            "symbols": config.symbols,
+            "symbols": list(config.symbols),
             "target_rtp": config.target_rtp
         }
     }
     
+    if stats is not None:
+        summary = stats.summary()
+        index_data["volatility"] = summary["volatility"]
+        index_data["standard_deviation"] = round(summary["standard_deviation"], 4)
+        index_data["payout_percentiles"] = {key: round(value, 2) for key, value in summary["payout_percentiles"].items()}
+    
+    if total_weight is not None:
+        index_data["exact"] = criteria is None
+        index_data["total_weight"] = total_weight
+    
+    if criteria is not None:
+        index_data["criteria"] = criteria
+    
+    if seed is not None:
+        index_data["rng"] = {
+            "seed": seed,
+            "stream_name": stream_name,
+            "stream": mode_stream(stream_name)
+        }
+    
+    if blocked_books:
+        index_data["files"]["books_blocks"] = "books/books_base.books"
+        index_data["files"]["books_blocks_index"] = "books/books_base.books.idx"
+    
     index_file = publish_dir / "index.json"
     with open(index_file, 'w') as f:
         json.dump(index_data, f, indent=2)
     
+    return index_file
+
+def iter_outcomes(config: CompiledGameConfig, num_simulations: int, seed: int = None, batch_size: int = BATCH_SIZE, first_id: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Yield outcomes `first_id` .. `num_simulations` one at a time, generated
+    in batches of `batch_size`.
+    
+    Only one batch is held in memory at once.
+    """
+    rng = CounterRNG(seed, mode_stream("base"))
+    
+    for start_id in range(first_id, num_simulations + 1, batch_size):
+        batch = run_spins_batch(config, min(batch_size, num_simulations - start_id + 1), rng, start_counter=start_id)
+        yield from iter_batch_results(config, batch, start_id)
+        print(f"Generated {min(start_id + batch_size - 1, num_simulations)} outcomes...")
+
+def write_books(outcomes: Iterable[Dict[str, Any]], books_file: BinaryIO, chunk_size: int = BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Write each outcome to the gzipped books file and pass it on.
+    
+    Every `chunk_size` outcomes are compressed as one gzip member, so the
+    file can be cut and resumed at a chunk boundary.
+    """
+    lines = []
+    for outcome in outcomes:
+        lines.append(json.dumps(outcome) + '\n')
+        if len(lines) == chunk_size:
+            books_file.write(gzip.compress(''.join(lines).encode(), mtime=0))
+            lines = []
+        yield outcome
+    
+    if lines:
+        books_file.write(gzip.compress(''.join(lines).encode(), mtime=0))
+
+def write_blocked_books(outcomes: Iterable[Dict[str, Any]], writer: BooksWriter) -> Iterator[Dict[str, Any]]:
+    """Write each outcome to the random-access books and pass it on."""
+    for outcome in outcomes:
+        writer.write_record(outcome)
+        yield outcome
+
+def write_lookup_rows(outcomes: Iterable[Dict[str, Any]], lookup_file: TextIO, criteria_file: TextIO, header: bool = True) -> Iterator[Dict[str, Any]]:
+    """Write the lookup table and criteria rows for each outcome and pass it on."""
+    lookup_writer = csv.writer(lookup_file)
+    criteria_writer = csv.writer(criteria_file)
+    if header:
+        lookup_writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
+        criteria_writer.writerow(['simulation_id', 'criteria'])
+    
+    for outcome in outcomes:
+        lookup_writer.writerow([outcome["id"], 1, outcome["payoutMultiplier"]])
+        criteria_writer.writerow([outcome["id"], outcome["criteria"]])
+        yield outcome
+
+def write_column_rows(outcomes: Iterable[Dict[str, Any]], writer: LookupColumnsWriter, chunk_size: int = BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Append each outcome to the lookup columns, a chunk at a time, and pass it on."""
+    rows = []
+    for outcome in outcomes:
+        rows.append((outcome["id"], outcome["payoutMultiplier"], outcome["criteria"]))
+        if len(rows) == chunk_size:
+            ids, payouts, criteria = zip(*rows)
+            writer.append(ids, [1] * len(rows), payouts, criteria)
+            rows = []
+        yield outcome
+    
+    if rows:
+        ids, payouts, criteria = zip(*rows)
+        writer.append(ids, [1] * len(rows), payouts, criteria)
+
+def checkpoint_outcomes(outcomes: Iterable[Dict[str, Any]], every: int, save: Callable[[int], None]) -> Iterator[Dict[str, Any]]:
+    """
+    Pass outcomes on, calling `save(id)` after every `every`-th outcome.
+    
+    As the last stage before the consumer, it only resumes once every stage
+    has handled the outcome, so `save` sees the whole pipeline up to `id`.
+    """
+    for outcome in outcomes:
+        yield outcome
+        if outcome["id"] % every == 0:
+            save(outcome["id"])
+
+def summarize_outcomes(outcomes: Iterable[Dict[str, Any]], totals: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Consume outcomes, keeping running totals and mergeable payout statistics only.
+    
+    `totals` (as returned by an earlier call) is updated in place, so a
+    resumed run carries on from its checkpoint and a checkpoint can read
+    the totals while outcomes are still flowing. Payouts are added a batch
+    at a time; a batch ends at every id that is a multiple of BATCH_SIZE,
+    so the totals are complete wherever a checkpoint is saved.
+    """
+    if totals is None:
+        totals = {"total_outcomes": 0, "winning_outcomes": 0, "total_payout": 0.0, "stats": PayoutStats()}
+    
+    def add_batch(payouts: List[float]) -> None:
+        batch = np.asarray(payouts, dtype=np.float64)
+        totals["total_outcomes"] += len(batch)
+        totals["total_payout"] += float(batch.sum())
+        totals["winning_outcomes"] += int(np.count_nonzero(batch > 0))
+        totals["stats"].update_batch(batch)
+    
+    payouts = []
+    for outcome in outcomes:
+        payouts.append(outcome["payoutMultiplier"])
+        if outcome["id"] % BATCH_SIZE == 0 or len(payouts) == BATCH_SIZE:
+            add_batch(payouts)
+            payouts = []
+    
+    if payouts:
+        add_batch(payouts)
+    
+    return totals
+
+def generate_outcomes_streaming(num_simulations: int, output_dir: str = "library", seed: int = None, blocked_books: bool = False, checkpoint_every: int = 0) -> None:
+    """
+    Generate outcomes through a generator pipeline in a single pass.
+    
+    Spins flow from the batch kernel through the books writer and the
+    lookup/criteria writers into running statistics, so memory stays
+    bounded by one batch regardless of `num_simulations`.
+    
+    With `checkpoint_every`, the file lengths and running totals are saved
+    to books/checkpoint_base.json every that many outcomes (rounded up to a
+    multiple of BATCH_SIZE). Rerunning with the same arguments (the seed
+    may be left out) resumes from there and writes the same files as an
+    uninterrupted run.
+    
+    Args:
+        num_simulations: Number of simulations to generate
+        output_dir: Directory to store output files
+        seed: Seed for the RNG (None draws a fresh seed)
+        blocked_books: Also write random-access books (books_base.books + .idx)
+        checkpoint_every: Outcomes between checkpoints (0 disables)
+    """
+    print(f"Generating {num_simulations} outcomes (streaming)...")
+    
+    config = load_config()
+    
+    books_dir = Path(output_dir) / "books"
+    lookup_dir = Path(output_dir) / "lookup_tables"
+    publish_dir = Path(output_dir) / "publish_files"
+    
+    books_dir.mkdir(parents=True, exist_ok=True)
+    lookup_dir.mkdir(parents=True, exist_ok=True)
+    publish_dir.mkdir(parents=True, exist_ok=True)
+    
+    books_file = books_dir / "books_base.jsonl.gz"
+    lookup_file = lookup_dir / "lookUpTable_base.csv"
+    criteria_file = lookup_dir / "lookUpTableIdToCriteria_base.csv"
+    blocks_file = books_dir / "books_base.books"
+    
+    checkpoint_every = -(-checkpoint_every // BATCH_SIZE) * BATCH_SIZE
+    # A changed game definition starts afresh rather than resuming
+    checkpoint = Checkpoint(str(books_dir / "checkpoint_base.json"), {
+        "config": config.content_hash,
+        "num_simulations": num_simulations,
+        "seed": seed,
+        "blocked_books": blocked_books,
+        "checkpoint_every": checkpoint_every
+    })
+    resume = checkpoint.load() if checkpoint_every else None
+    seed = checkpoint.params["seed"]
+    if seed is None:
+        seed = checkpoint.params["seed"] = np.random.SeedSequence().entropy
+    
+    totals = summarize_outcomes(())
+    if resume:
+        print(f"Resuming from checkpoint after outcome {resume['completed']}")
+        totals = dict(resume["totals"], stats=PayoutStats.from_dict(resume["totals"]["stats"]))
+    
+    def open_output(path: Path, position_key: str, mode: str, **kwargs):
+        if resume:
+            return reopen_at(str(path), resume[position_key], mode.replace('w', 'a'), **kwargs)
+        return open(path, mode, **kwargs)
+    
+    # The columns writer closes last so its meta.json is newer than the CSV
+    with LookupColumnsWriter(str(lookup_file), resume=resume["columns"] if resume else None) as columns, \
+            open_output(books_file, "books", 'wb') as books, \
+            open_output(lookup_file, "lookup", 'w', newline='') as lookup, \
+            open_output(criteria_file, "criteria", 'w', newline='') as criteria:
+        blocks_writer = None
+        if blocked_books:
+            blocks_writer = BooksWriter(str(blocks_file), resume=resume["blocks_writer"] if resume else None)
+        
+        def save_checkpoint(last_id: int) -> None:
+            # Files are synced before the checkpoint that points into them
+            checkpoint.save({
+                "completed": last_id,
+                "books": sync_position(books),
+                "blocks_writer": blocks_writer.checkpoint() if blocks_writer else None,
+                "lookup": sync_position(lookup),
+                "criteria": sync_position(criteria),
+                "columns": columns.checkpoint(),
+                "totals": dict(totals, stats=totals["stats"].to_dict())
+            })
+        
+        outcomes = iter_outcomes(config, num_simulations, seed, first_id=resume["completed"] + 1 if resume else 1)
+        outcomes = write_books(outcomes, books)
+        if blocks_writer:
+            outcomes = write_blocked_books(outcomes, blocks_writer)
+        outcomes = write_lookup_rows(outcomes, lookup, criteria, header=not resume)
+        outcomes = write_column_rows(outcomes, columns)
+        if checkpoint_every:
+            outcomes = checkpoint_outcomes(outcomes, checkpoint_every, save_checkpoint)
+        stats = summarize_outcomes(outcomes, totals)
+        if blocks_writer:
+            blocks_writer.close()
+    
+    checkpoint.remove()
+    
+    print(f"Written books file: {books_file}")
+    if blocked_books:
+        print(f"Written blocked books file: {blocks_file}")
+    print(f"Written lookup table: {lookup_file}")
+    print(f"Written criteria mapping: {criteria_file}")
+    print(f"Written lookup columns: {columns.path}")
+    
+    total_outcomes = stats["total_outcomes"]
+    winning_outcomes = stats["winning_outcomes"]
+    rtp = (stats["total_payout"] / total_outcomes) * 100 if total_outcomes else 0.0
+    hit_frequency = (winning_outcomes / total_outcomes) * 100 if total_outcomes else 0.0
+    
+    index_file = write_index(publish_dir, config, total_outcomes, rtp, hit_frequency, blocked_books, stats["stats"], seed=seed, stream_name="base")
+    
     print(f"Written index file: {index_file}")
     print(f"Statistics:")
     print(f"  RTP: {rtp:.2f}%")
     print(f"  Hit Frequency: {hit_frequency:.2f}%")
-    print(f"  Total Outcomes: {num_simulations}")
+    print(f"  Total Outcomes: {total_outcomes}")
     print(f"  Winning Outcomes: {winning_outcomes}")
 
+def generate_outcomes_exact(output_dir: str = "library", blocked_books: bool = False, chunk_size: int = 1 << 16) -> None:
+    """
+    Generate books with exact weights by enumerating the reels instead of sampling.
+    
+    Every distinct board is written once, weighted by the number of reel stop
+    combinations that show it, so the lookup table reproduces the game's
+    exact distribution (see `rtp_calculator.calculate_exact_rtp`). Output
+    files have the same layout as the sampled modes.
+    
+    Args:
+        output_dir: Directory to store output files
+        blocked_books: Also write random-access books (books_base.books + .idx)
+        chunk_size: Number of boards enumerated per chunk
+    """
+    print("Generating exact outcomes by enumeration...")
+    
+    config = load_config()
+    
+    books_dir = Path(output_dir) / "books"
+    lookup_dir = Path(output_dir) / "lookup_tables"
+    publish_dir = Path(output_dir) / "publish_files"
+    
+    books_dir.mkdir(parents=True, exist_ok=True)
+    lookup_dir.mkdir(parents=True, exist_ok=True)
+    publish_dir.mkdir(parents=True, exist_ok=True)
+    
+    books_file = books_dir / "books_base.jsonl.gz"
+    lookup_file = lookup_dir / "lookUpTable_base.csv"
+    criteria_file = lookup_dir / "lookUpTableIdToCriteria_base.csv"
+    blocks_file = books_dir / "books_base.books"
+    
+    stats = PayoutStats()
+    total_outcomes = 0
+    
+    # The columns writer closes last so its meta.json is newer than the CSV
+    with LookupColumnsWriter(str(lookup_file)) as columns, \
+            gzip.open(books_file, 'wt') as books, \
+            open(lookup_file, 'w', newline='') as lookup, \
+            open(criteria_file, 'w', newline='') as criteria:
+        lookup_writer = csv.writer(lookup)
+        lookup_writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
+        criteria_writer = csv.writer(criteria)
+        criteria_writer.writerow(['simulation_id', 'criteria'])
+        blocks_writer = BooksWriter(str(blocks_file)) if blocked_books else None
+        
+        for boards, weights in iter_window_combinations(config, chunk_size):
+            batch = evaluate_boards(config, boards)
+            first_id = total_outcomes + 1
+            
+            ids = []
+            criteria_names = []
+            for result in iter_batch_results(config, batch, first_id):
+                line = json.dumps(result) + '\n'
+                books.write(line)
+                if blocks_writer:
+                    blocks_writer.write_line(result["id"], line)
+                ids.append(result["id"])
+                criteria_names.append(result["criteria"])
+            
+            lookup_writer.writerows(zip(ids, weights.tolist(), batch["payouts"].tolist()))
+            criteria_writer.writerows(zip(ids, criteria_names))
+            columns.append(ids, weights, batch["payouts"], criteria_names)
+            stats.update_batch(batch["payouts"], weights)
+            total_outcomes += len(ids)
+        
+        if blocks_writer:
+            blocks_writer.close()
+    
+    print(f"Written books file: {books_file}")
+    if blocked_books:
+        print(f"Written blocked books file: {blocks_file}")
+    print(f"Written lookup table: {lookup_file}")
+    print(f"Written criteria mapping: {criteria_file}")
+    print(f"Written lookup columns: {columns.path}")
+    
+    summary = stats.summary()
+    total_weight = int(stats.total_weight)
+    index_file = write_index(publish_dir, config, total_outcomes, summary["rtp_percent"], summary["hit_frequency_percent"], blocked_books, stats, total_weight)
+    
+    print(f"Written index file: {index_file}")
+    print(f"Statistics:")
+    print(f"  RTP: {summary['rtp_percent']:.4f}% (exact)")
+    print(f"  Hit Frequency: {summary['hit_frequency_percent']:.4f}% (exact)")
+    print(f"  Distinct Outcomes: {total_outcomes}")
+    print(f"  Stop Combinations: {total_weight}")
+
+def split_by_criteria(config: CompiledGameConfig, criteria: Dict[str, Callable], chunk_size: int = 1 << 16) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Enumerate every distinct board and assign each to its first matching criterion.
+    
+    Returns:
+        Criterion name -> boards (n, reels * rows), weights (stop
+        combinations showing each board) and payouts
+    """
+    parts = {name: {"boards": [], "weights": [], "payouts": []} for name in criteria}
+    
+    for boards, weights in iter_window_combinations(config, chunk_size):
+        batch = evaluate_boards(config, boards)
+        unassigned = np.ones(len(boards), dtype=bool)
+        for name, criterion in criteria.items():
+            mask = unassigned & criterion(config, batch)
+            unassigned &= ~mask
+            parts[name]["boards"].append(batch["boards"][mask])
+            parts[name]["weights"].append(weights[mask])
+            parts[name]["payouts"].append(batch["payouts"][mask])
+    
+    return {
+        name: {key: np.concatenate(values) for key, values in part.items()}
+        for name, part in parts.items()
+    }
+
+def apportion(total: int, n: int) -> np.ndarray:
+    """Split an integer weight into n equal shares, by largest remainder."""
+    shares = np.full(n, total // n, dtype=np.int64)
+    # Equal shares have equal remainders, so the leftover units go to the first outcomes
+    shares[:total % n] += 1
+    return shares
+
+def generate_outcomes_targeted(quotas: Dict[str, int] = None, output_dir: str = "library", seed: int = None, blocked_books: bool = False, chunk_size: int = 1 << 16) -> None:
+    """
+    Generate books with a quota of outcomes for each criterion, rare ones included.
+    
+    Boards are enumerated once and split by TARGET_CRITERIA, which gives the
+    exact probability mass of every criterion and its conditional
+    distribution over boards. Each criterion's outcomes are then drawn from
+    that distribution directly, so rare events need no rejection sampling;
+    a criterion with no more distinct boards than its quota is written out
+    exactly instead.
+    
+    Weights stay unbiased: a criterion's outcomes share its probability mass
+    (in stop combinations, scaled so every outcome gets at least 1),
+    apportioned by largest remainder. The lookup table therefore estimates
+    the game's true distribution and weighted RTP matches the exact RTP up
+    to sampling noise.
+    
+    Args:
+        quotas: Outcomes per criterion, over DEFAULT_CRITERIA_QUOTAS
+        output_dir: Directory to store output files
+        seed: RNG seed (None draws a fresh seed); outcome id i is drawn at
+            counter i of the "targeted" stream
+        blocked_books: Also write random-access books (books_base.books + .idx)
+        chunk_size: Number of boards enumerated per chunk
+    
+    Raises:
+        ValueError: For an unknown criterion, a criterion that can occur but
+            has no quota, or a criterion too large to draw with 32-bit values
+    """
+    quotas = {**DEFAULT_CRITERIA_QUOTAS, **(quotas or {})}
+    unknown = set(quotas) - set(TARGET_CRITERIA)
+    if unknown:
+        raise ValueError(f"Unknown criteria: {', '.join(sorted(unknown))}")
+    
+    print(f"Generating criteria-targeted outcomes {quotas}...")
+    
+    config = load_config()
+    rng = CounterRNG(seed, mode_stream("targeted"))
+    strata = split_by_criteria(config, TARGET_CRITERIA, chunk_size)
+    total_combinations = sum(int(stratum["weights"].sum()) for stratum in strata.values())
+    
+    plan = []
+    for name, stratum in strata.items():
+        mass = int(stratum["weights"].sum())
+        if mass == 0:
+            print(f"Criterion {name} cannot occur; skipped")
+            continue
+        if quotas.get(name, 0) <= 0:
+            raise ValueError(f"Criterion {name} can occur but has no quota")
+        if mass >= 1 << 32:
+            raise ValueError(f"Criterion {name} has too many stop combinations to draw from")
+        plan.append((name, stratum, mass, len(stratum["weights"]) <= quotas[name]))
+    
+    # Sampled criteria split their mass over their quota, so scale every
+    # weight until each outcome gets at least 1
+    scale = max([-(-quotas[name] // mass) for name, _, mass, exact in plan if not exact], default=1)
+    
+    books_dir = Path(output_dir) / "books"
+    lookup_dir = Path(output_dir) / "lookup_tables"
+    publish_dir = Path(output_dir) / "publish_files"
+    
+    books_dir.mkdir(parents=True, exist_ok=True)
+    lookup_dir.mkdir(parents=True, exist_ok=True)
+    publish_dir.mkdir(parents=True, exist_ok=True)
+    
+    books_file = books_dir / "books_base.jsonl.gz"
+    lookup_file = lookup_dir / "lookUpTable_base.csv"
+    criteria_file = lookup_dir / "lookUpTableIdToCriteria_base.csv"
+    blocks_file = books_dir / "books_base.books"
+    
+    stats = PayoutStats()
+    total_outcomes = 0
+    criteria_summary = {}
+    
+    # The columns writer closes last so its meta.json is newer than the CSV
+    with LookupColumnsWriter(str(lookup_file)) as columns, \
+            gzip.open(books_file, 'wt') as books, \
+            open(lookup_file, 'w', newline='') as lookup, \
+            open(criteria_file, 'w', newline='') as criteria:
+        lookup_writer = csv.writer(lookup)
+        lookup_writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
+        criteria_writer = csv.writer(criteria)
+        criteria_writer.writerow(['simulation_id', 'criteria'])
+        blocks_writer = BooksWriter(str(blocks_file)) if blocked_books else None
+        
+        for name, stratum, mass, exact in plan:
+            if exact:
+                count = len(stratum["weights"])
+                shares = stratum["weights"] * scale
+            else:
+                count = quotas[name]
+                shares = apportion(mass * scale, count)
+                cumulative = np.cumsum(stratum["weights"])
+            
+            for start in range(0, count, BATCH_SIZE):
+                end = min(start + BATCH_SIZE, count)
+                first_id = total_outcomes + 1
+                if exact:
+                    indices = np.arange(start, end)
+                else:
+                    # A uniform draw over the criterion's stop combinations picks
+                    # each board in proportion to its weight
+                    draws = rng.batch_stops(first_id, end - start, (mass,))[0]
+                    indices = np.searchsorted(cumulative, draws, side='right')
+                batch = evaluate_boards(config, stratum["boards"][indices])
+                weights = shares[start:end]
+                
+                ids = []
+                for result in iter_batch_results(config, batch, first_id):
+                    result["criteria"] = name
+                    line = json.dumps(result) + '\n'
+                    books.write(line)
+                    if blocks_writer:
+                        blocks_writer.write_line(result["id"], line)
+                    ids.append(result["id"])
+                
+                lookup_writer.writerows(zip(ids, weights.tolist(), batch["payouts"].tolist()))
+                criteria_writer.writerows((sim_id, name) for sim_id in ids)
+                columns.append(ids, weights, batch["payouts"], [name] * len(ids))
+                stats.update_batch(batch["payouts"], weights)
+                total_outcomes += len(ids)
+            
+            criteria_summary[name] = {
+                "probability": mass / total_combinations,
+                "outcomes": count,
+                "exact": exact
+            }
+            print(f"  {name}: {count} outcomes, probability {mass / total_combinations:.4e}{' (exact)' if exact else ''}")
+        
+        if blocks_writer:
+            blocks_writer.close()
+    
+    print(f"Written books file: {books_file}")
+    if blocked_books:
+        print(f"Written blocked books file: {blocks_file}")
+    print(f"Written lookup table: {lookup_file}")
+    print(f"Written criteria mapping: {criteria_file}")
+    print(f"Written lookup columns: {columns.path}")
+    
+    summary = stats.summary()
+    total_weight = int(stats.total_weight)
+    exact_rtp = sum(float(stratum["weights"] @ stratum["payouts"]) for stratum in strata.values()) / total_combinations * 100
+    index_file = write_index(publish_dir, config, total_outcomes, summary["rtp_percent"], summary["hit_frequency_percent"], blocked_books, stats, total_weight, criteria_summary, seed=rng.seed, stream_name="targeted")
+    
+    print(f"Written index file: {index_file}")
+    print(f"Statistics:")
+    print(f"  RTP: {summary['rtp_percent']:.4f}% (exact {exact_rtp:.4f}%)")
+    print(f"  Hit Frequency: {summary['hit_frequency_percent']:.4f}%")
+    print(f"  Total Outcomes: {total_outcomes}")
+    print(f"  Total Weight: {total_weight}")
+
 def main():
     """Main entry point for outcome generation."""
     if len(sys.argv) < 2:
-        print("Usage: python outcome_generator.py <num_simulations>")
+        print("Usage: python outcome_generator.py <num_simulations> [--stream] [--blocks] [--checkpoint <outcomes>] [--seed <seed>]")
+        print("       python outcome_generator.py --exact [--blocks]")
+        print("       python outcome_generator.py --targeted [criterion=quota,...] [--blocks] [--seed <seed>]")
         sys.exit(1)
     
+    if sys.argv[1] == "--exact":
+        generate_outcomes_exact(blocked_books="--blocks" in sys.argv[2:])
+        print("Outcome generation completed successfully!")
+        return
+    
+    if sys.argv[1] == "--targeted":
+        options = sys.argv[2:]
+        quotas = {}
+        try:
+            if options and "=" in options[0]:
+                for item in options[0].split(","):
+                    name, quota = item.split("=")
+                    quotas[name] = int(quota)
+            seed = int(options[options.index("--seed") + 1]) if "--seed" in options else None
+        except (ValueError, IndexError):
+            print("Error: quotas must be criterion=<integer> pairs and --seed an integer")
+            print("Usage: python outcome_generator.py --targeted [criterion=quota,...] [--blocks] [--seed <seed>]")
+            sys.exit(1)
+        
+        try:
+            generate_outcomes_targeted(quotas, seed=seed, blocked_books="--blocks" in options)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print("Outcome generation completed successfully!")
+        return
+    
     try:
         num_simulations = int(sys.argv[1])
-        generate_outcomes(num_simulations)
+        options = sys.argv[2:]
+        # Checkpoints need the streaming pipeline
+        checkpoint_every = int(options[options.index("--checkpoint") + 1]) if "--checkpoint" in options else 0
+        seed = int(options[options.index("--seed") + 1]) if "--seed" in options else None
+        generate_outcomes(
+            num_simulations,
+            streaming="--stream" in options or checkpoint_every > 0,
+            seed=seed,
+            blocked_books="--blocks" in options,
+            checkpoint_every=checkpoint_every
+        )
         print("Outcome generation completed successfully!")
-        
-    except ValueError:
-        print("Error: num_simulations must be an integer")
+    
+    except (ValueError, IndexError):
+        print("Error: num_simulations, --checkpoint and --seed must be integers")
         sys.exit(1)
     except Exception as e:
         print(f"Error generating outcomes: {e}")
@@ -4,41 +4,52 @@ RTP Calculator and Optimizer for Stake Engine compliance.
 Analyzes game statistics and optimizes weights to achieve target RTP.
 """
 
-import csv
 import json
 import sys
 from pathlib import Path
-from typing import Dict, List, Tuple
-
-def load_lookup_table(file_path: str) -> List[Dict]:
-    """Load simulation data from lookup table CSV."""
-    data = []
-    with open(file_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            data.append({
-                'id': int(row['simulation_id']),
-                'weight': int(row['weight']),
-                'payout': float(row['payout_multiplier'])
-            })
-    return data
-
-def calculate_rtp(simulations: List[Dict]) -> Tuple[float, Dict]:
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+
+# Add the games directory to path
+sys.path.append(str(Path(__file__).parent.parent / "games" / "slot_3x5"))
+
+from game_config import CompiledGameConfig, load_config
+from lookup_columns import LookupColumns, load_lookup_columns, save_lookup_table
+from sim_stats import DEFAULT_BIN_EDGES, PayoutStats
+from weight_optimizer import optimize_weight_arrays
+
+# PAR sheet names of the default payout histogram bins
+DEFAULT_DISTRIBUTION_KEYS = [
+    "no_win_percent",
+    "small_win_1_10x_percent",
+    "medium_win_11_50x_percent",
+    "large_win_51_100x_percent",
+    "mega_win_100x_plus_percent"
+]
+
+def load_lookup_table(file_path: str) -> LookupColumns:
+    """Load a lookup table as memory-mapped columns, building them from the CSV if needed."""
+    return load_lookup_columns(file_path)
+
+def calculate_rtp(table: LookupColumns) -> Tuple[float, Dict]:
     """Calculate current RTP and statistics."""
-    total_weight = sum(sim['weight'] for sim in simulations)
-    weighted_payout = sum(sim['payout'] * sim['weight'] for sim in simulations)
+    weights = table.weight
+    payouts = table.payout
+    total_weight = int(weights.sum())
     
     if total_weight == 0:
         return 0.0, {}
     
+    weighted_payout = float(weights @ payouts)
     rtp = (weighted_payout / total_weight) * 100
     
     # Calculate additional statistics
-    winning_sims = [sim for sim in simulations if sim['payout'] > 0]
-    total_wins = sum(sim['weight'] for sim in winning_sims)
-    hit_frequency = (total_wins / total_weight) * 100 if total_weight > 0 else 0
+    winning = payouts > 0
+    total_wins = int(weights[winning].sum())
+    hit_frequency = (total_wins / total_weight) * 100
     
-    max_win = max(sim['payout'] for sim in simulations) if simulations else 0
+    max_win = float(payouts.max()) if len(payouts) else 0
     avg_win = weighted_payout / total_wins if total_wins > 0 else 0
     
     stats = {
@@ -46,46 +57,19 @@ def calculate_rtp(simulations: List[Dict]) -> Tuple[float, Dict]:
         'hit_frequency': hit_frequency,
         'max_win': max_win,
         'average_win': avg_win,
-        'total_simulations': len(simulations),
-        'winning_simulations': len(winning_sims),
+        'total_simulations': len(table),
+        'winning_simulations': int(np.count_nonzero(winning)),
         'total_weight': total_weight
     }
     
     return rtp, stats
 
-def optimize_weights(simulations: List[Dict], target_rtp: float, max_iterations: int = 100) -> List[Dict]:
-    """Optimize simulation weights to achieve target RTP."""
+def optimize_weights(table: LookupColumns, target_rtp: float, target_hit_frequency: float = None) -> LookupColumns:
+    """Optimize simulation weights to achieve target RTP (and hit frequency, if given)."""
     print(f"Optimizing weights for target RTP: {target_rtp}%")
     
-    # Create a copy to work with
-    optimized = [sim.copy() for sim in simulations]
-    
-    for iteration in range(max_iterations):
-        current_rtp, _ = calculate_rtp(optimized)
-        
-        if abs(current_rtp - target_rtp) < 0.1:
-            print(f"Target RTP achieved in {iteration} iterations")
-            break
-        
-        # Adjust weights based on payout distribution
-        adjustment_factor = target_rtp / current_rtp if current_rtp > 0 else 1.0
-        
-        for sim in optimized:
-            if sim['payout'] == 0:
-                # Increase weight for non-winning outcomes if RTP is too high
-                if current_rtp > target_rtp:
-                    sim['weight'] = max(1, int(sim['weight'] * 1.1))
-            else:
-                # Adjust winning outcomes based on their payout
-                if current_rtp < target_rtp:
-                    # Need to increase RTP - boost winning weights
-                    sim['weight'] = max(1, int(sim['weight'] * adjustment_factor))
-                else:
-                    # Need to decrease RTP - reduce winning weights
-                    sim['weight'] = max(1, int(sim['weight'] / adjustment_factor))
-        
-        if iteration % 10 == 0:
-            print(f"Iteration {iteration}: RTP = {current_rtp:.2f}%")
+    new_weights, stats = optimize_weight_arrays(table.payout, table.weight, target_rtp, target_hit_frequency)
+    optimized = table.with_weights(new_weights)
     
     final_rtp, final_stats = calculate_rtp(optimized)
     print(f"Final RTP: {final_rtp:.2f}%")
@@ -93,47 +77,26 @@ def optimize_weights(simulations: List[Dict], target_rtp: float, max_iterations:
     
     return optimized
 
-def save_optimized_table(optimized_data: List[Dict], output_file: str) -> None:
-    """Save optimized lookup table to CSV."""
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['simulation_id', 'weight', 'payout_multiplier'])
-        
-        for sim in optimized_data:
-            writer.writerow([sim['id'], sim['weight'], sim['payout']])
+def save_optimized_table(optimized_data: LookupColumns, output_file: str) -> None:
+    """Save optimized lookup table to CSV, with its columns alongside."""
+    save_lookup_table(output_file, optimized_data)
 
-def generate_par_sheet(simulations: List[Dict], output_file: str) -> None:
+def generate_par_sheet(table: LookupColumns, output_file: str, bin_edges: Sequence[float] = DEFAULT_BIN_EDGES, chunk_size: int = 1 << 22) -> None:
     """Generate PAR sheet with detailed game statistics."""
-    rtp, stats = calculate_rtp(simulations)
-    
-    # Calculate payout distribution
-    payout_ranges = {
-        '0x': 0,
-        '1-10x': 0,
-        '11-50x': 0,
-        '51-100x': 0,
-        '100x+': 0
-    }
-    
-    for sim in simulations:
-        payout = sim['payout']
-        weight = sim['weight']
-        
-        if payout == 0:
-            payout_ranges['0x'] += weight
-        elif payout <= 10:
-            payout_ranges['1-10x'] += weight
-        elif payout <= 50:
-            payout_ranges['11-50x'] += weight
-        elif payout <= 100:
-            payout_ranges['51-100x'] += weight
-        else:
-            payout_ranges['100x+'] += weight
+    # One weighted pass over the columns
+    stats = PayoutStats(bin_edges)
+    winning_simulations = 0
+    for start in range(0, len(table), chunk_size):
+        payouts = table.payout[start:start + chunk_size]
+        stats.update_batch(payouts, table.weight[start:start + chunk_size])
+        winning_simulations += int(np.count_nonzero(payouts > 0))
     
-    # Convert to percentages
-    total_weight = stats['total_weight']
-    for range_key in payout_ranges:
-        payout_ranges[range_key] = (payout_ranges[range_key] / total_weight) * 100
+    summary = stats.summary()
+    payout_ranges = summary['payout_distribution_percent']
+    if tuple(bin_edges) == DEFAULT_BIN_EDGES:
+        distribution_keys = DEFAULT_DISTRIBUTION_KEYS
+    else:
+        distribution_keys = [f"{label}_percent" for label in payout_ranges]
     
     par_data = {
         "game_info": {
@@ -144,23 +107,24 @@ def generate_par_sheet(simulations: List[Dict], output_file: str) -> None:
             "paylines": 20
         },
         "mathematics": {
-            "rtp_percent": round(rtp, 2),
-            "hit_frequency_percent": round(stats['hit_frequency'], 2),
-            "volatility": "Medium",
-            "max_win_multiplier": stats['max_win'],
-            "average_win_multiplier": round(stats['average_win'], 2)
+            "rtp_percent": round(summary['rtp_percent'], 2),
+            "rtp_confidence_interval_95": [round(bound, 2) for bound in summary['rtp_confidence_interval_95']],
+            "hit_frequency_percent": round(summary['hit_frequency_percent'], 2),
+            "volatility": summary['volatility'],
+            "volatility_index": round(summary['volatility_index'], 4),
+            "variance": round(summary['variance'], 4),
+            "standard_deviation": round(summary['standard_deviation'], 4),
+            "max_win_multiplier": summary['max_win_multiplier'],
+            "average_win_multiplier": round(summary['average_win_multiplier'], 2),
+            "payout_percentiles": {key: round(value, 2) for key, value in summary['payout_percentiles'].items()}
         },
         "simulation_data": {
-            "total_simulations": stats['total_simulations'],
-            "winning_simulations": stats['winning_simulations'],
-            "total_weight": stats['total_weight']
+            "total_simulations": len(table),
+            "winning_simulations": winning_simulations,
+            "total_weight": int(stats.total_weight)
         },
         "payout_distribution": {
-            "no_win_percent": round(payout_ranges['0x'], 2),
-            "small_win_1_10x_percent": round(payout_ranges['1-10x'], 2),
-            "medium_win_11_50x_percent": round(payout_ranges['11-50x'], 2),
-            "large_win_51_100x_percent": round(payout_ranges['51-100x'], 2),
-            "mega_win_100x_plus_percent": round(payout_ranges['100x+'], 2)
+            key: round(percent, 2) for key, percent in zip(distribution_keys, payout_ranges.values())
         }
     }
     
@@ -169,14 +133,194 @@ def generate_par_sheet(simulations: List[Dict], output_file: str) -> None:
     
     print(f"PAR sheet saved to: {output_file}")
 
+def reel_windows(config: CompiledGameConfig, reel: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    List the distinct symbol windows a reel can show and how often each occurs.
+    
+    Stops follow `gamestate.generate_board`, which draws the window start from
+    0 to len(strip) - rows inclusive.
+    
+    Args:
+        config: Game configuration
+        reel: Index of the reel
+    
+    Returns:
+        Tuple of (windows, counts): an array of symbol ids with shape
+        (distinct_windows, rows) and the number of stops producing each window
+    """
+    strip = config.reel_strip_ids[reel]
+    num_stops = config.stop_counts[reel]
+    
+    windows = np.array([
+        [strip[(stop + row) % len(strip)] for row in range(config.rows)]
+        for stop in range(num_stops)
+    ], dtype=np.int64)
+    
+    return np.unique(windows, axis=0, return_counts=True)
+
+def build_line_payouts(config: CompiledGameConfig) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convert the config's compiled payline table into arrays indexed by line code.
+    
+    Lines are encoded as base-N integers of symbol ids, first reel most
+    significant, where N is the number of symbols.
+    
+    Args:
+        config: Game configuration
+    
+    Returns:
+        Tuple of (symbol, count, payout) arrays indexed by line code; symbol
+        is -1 where the line does not pay
+    """
+    table = config.payline_table
+    
+    symbols = np.full(len(table.results), -1, dtype=np.int64)
+    counts = np.zeros(len(table.results), dtype=np.int64)
+    payouts = np.zeros(len(table.results), dtype=np.float64)
+    
+    for code, result in enumerate(table.results):
+        if result is not None:
+            symbol, count, payout = result
+            symbols[code] = table.symbol_ids[symbol]
+            counts[code] = count
+            payouts[code] = payout
+    
+    return symbols, counts, payouts
+
+def iter_window_combinations(config: CompiledGameConfig, chunk_size: int = 1 << 16) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Walk every distinct board the reels can show, in chunks.
+    
+    Reel stops showing the same window are collapsed into one entry, so each
+    board appears once with the number of stop combinations producing it.
+    
+    Args:
+        config: Game configuration
+        chunk_size: Number of boards per chunk
+    
+    Yields:
+        Tuples of (boards, weights): symbol ids with shape (n, reels * rows),
+        reel-major like generate_board, and integer weights summing to the
+        total number of stop combinations over all chunks
+    """
+    windows, window_counts = zip(*(reel_windows(config, reel) for reel in range(config.reels)))
+    shape = tuple(len(w) for w in windows)
+    num_entries = int(np.prod(shape))
+    
+    for start in range(0, num_entries, chunk_size):
+        flat = np.arange(start, min(start + chunk_size, num_entries), dtype=np.int64)
+        window_index = np.unravel_index(flat, shape)
+        
+        boards = np.concatenate(
+            [windows[reel][window_index[reel]] for reel in range(config.reels)], axis=1
+        )
+        weights = np.ones(len(flat), dtype=np.int64)
+        for reel in range(config.reels):
+            weights *= window_counts[reel][window_index[reel]]
+        
+        yield boards, weights
+
+def calculate_exact_rtp(config: CompiledGameConfig = None, chunk_size: int = 1 << 16) -> Dict[str, Any]:
+    """
+    Calculate exact RTP by enumerating every reel stop combination.
+    
+    Reel stops showing the same window are collapsed into one entry with a
+    multiplicity, and the product of distinct windows is walked in chunks.
+    Each chunk is scored with the compiled paytable used by `check_paylines`,
+    so the result follows the same rules without any sampling noise.
+    
+    Args:
+        config: Game configuration (defaults to load_config())
+        chunk_size: Number of window combinations scored per chunk
+    
+    Returns:
+        Dictionary with exact RTP, hit frequency and a per-symbol/kind breakdown
+    """
+    config = config or load_config()
+    num_symbols = len(config.symbols)
+    
+    line_symbols, line_counts, line_payouts = build_line_payouts(config)
+    
+    paylines = np.array(config.paylines, dtype=np.int64)
+    place_values = num_symbols ** np.arange(config.reels - 1, -1, -1, dtype=np.int64)
+    num_entries = 1
+    total_combinations = 1
+    for reel in range(config.reels):
+        windows, window_counts = reel_windows(config, reel)
+        num_entries *= len(windows)
+        total_combinations *= int(window_counts.sum())
+    
+    kinds = config.reels + 1
+    weighted_payout = 0.0
+    winning_combinations = 0
+    max_win = 0.0
+    breakdown_hits = np.zeros(num_symbols * kinds, dtype=np.float64)
+    breakdown_payout = np.zeros(num_symbols * kinds, dtype=np.float64)
+    
+    print(f"Enumerating {total_combinations} stop combinations "
+          f"({num_entries} distinct window combinations)...")
+    
+    for board, weights in iter_window_combinations(config, chunk_size):
+        codes = board[:, paylines] @ place_values
+        payouts = line_payouts[codes]
+        spin_payouts = payouts.sum(axis=1)
+        
+        weighted_payout += float(spin_payouts @ weights)
+        winning_combinations += int(weights[spin_payouts > 0].sum())
+        max_win = max(max_win, float(spin_payouts.max()))
+        
+        winning = line_symbols[codes] >= 0
+        keys = (line_symbols[codes] * kinds + line_counts[codes])[winning]
+        line_weights = np.broadcast_to(weights[:, None], codes.shape)[winning]
+        breakdown_hits += np.bincount(keys, weights=line_weights, minlength=len(breakdown_hits))
+        breakdown_payout += np.bincount(
+            keys, weights=line_weights * payouts[winning], minlength=len(breakdown_payout)
+        )
+    
+    breakdown = {}
+    for key in np.flatnonzero(breakdown_hits):
+        symbol, kind = divmod(int(key), kinds)
+        breakdown.setdefault(config.symbols[symbol], {})[kind] = {
+            'hits': int(breakdown_hits[key]),
+            'hit_frequency': breakdown_hits[key] / total_combinations * 100,
+            'rtp_contribution': breakdown_payout[key] / total_combinations * 100
+        }
+    
+    return {
+        'rtp': weighted_payout / total_combinations * 100,
+        'hit_frequency': winning_combinations / total_combinations * 100,
+        'total_combinations': total_combinations,
+        'winning_combinations': winning_combinations,
+        'total_payout': weighted_payout,
+        'max_win': max_win,
+        'breakdown': breakdown
+    }
+
+def save_exact_report(report: Dict[str, Any], output_file: str) -> None:
+    """Save an exact RTP report to JSON."""
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"Exact RTP report saved to: {output_file}")
+
 def main():
     """Main entry point for RTP calculation and optimization."""
     if len(sys.argv) < 2:
-        print("Usage: python rtp_calculator.py <lookup_table_file> [target_rtp]")
+        print("Usage: python rtp_calculator.py <lookup_table_file> [target_rtp] [target_hit_frequency]")
+        print("       python rtp_calculator.py --exact [output_file]")
         sys.exit(1)
     
+    if sys.argv[1] == "--exact":
+        output_file = sys.argv[2] if len(sys.argv) > 2 else "exact_rtp_report.json"
+        report = calculate_exact_rtp()
+        print(f"Exact RTP: {report['rtp']:.4f}%")
+        print(f"Exact Hit Frequency: {report['hit_frequency']:.4f}%")
+        save_exact_report(report, output_file)
+        return
+    
     lookup_file = sys.argv[1]
     target_rtp = float(sys.argv[2]) if len(sys.argv) > 2 else 96.5
+    target_hit_frequency = float(sys.argv[3]) if len(sys.argv) > 3 else None
     
     if not Path(lookup_file).exists():
         print(f"Error: Lookup table file not found: {lookup_file}")
@@ -193,8 +337,8 @@ def main():
         print(f"Current Hit Frequency: {current_stats['hit_frequency']:.2f}%")
         
         # Optimize if needed
-        if abs(current_rtp - target_rtp) > 0.1:
-            optimized_simulations = optimize_weights(simulations, target_rtp)
+        if abs(current_rtp - target_rtp) > 0.1 or target_hit_frequency is not None:
+            optimized_simulations = optimize_weights(simulations, target_rtp, target_hit_frequency)
             
             # Save optimized table
             output_file = lookup_file.replace('.csv', '_optimized.csv')
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Mergeable one-pass payout statistics for Stake Engine PAR sheets.
+Workers accumulate their own spins; the coordinator merges the results.
+"""
+
+import bisect
+import math
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Histogram bins are upper edges: a payout goes in the first bin whose edge
+# it does not exceed, and payouts above the last edge go in an overflow bin.
+# These defaults are the PAR sheet's 0x / 1-10x / 11-50x / 51-100x / 100x+.
+DEFAULT_BIN_EDGES = (0, 10, 50, 100)
+
+# Standard deviation (in bet multiples) below which each volatility class applies
+VOLATILITY_CLASSES = ((5, "Low"), (10, "Medium"), (20, "High"))
+
+# z-scores for the reported confidence interval and volatility index
+CONFIDENCE_Z = 1.96
+VOLATILITY_INDEX_Z = 1.645
+
+class QuantileSketch:
+    """
+    DDSketch quantile sketch with relative accuracy `alpha`.
+    
+    Positive values fall in logarithmic buckets, so any quantile is returned
+    within a factor (1 ± alpha) of the true value whatever the distribution.
+    Zero and negative values share one bucket reported as 0. Sketches with
+    the same alpha merge exactly.
+    """
+    
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_weight = 0.0
+        self.buckets: Dict[int, float] = {}
+    
+    @property
+    def total_weight(self) -> float:
+        return self.zero_weight + sum(self.buckets.values())
+    
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """Add one value."""
+        if value <= 0:
+            self.zero_weight += weight
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0.0) + weight
+    
+    def add_batch(self, values: np.ndarray, weights: np.ndarray = None) -> None:
+        """Add an array of values, optionally weighted."""
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        
+        positive = values > 0
+        self.zero_weight += float(weights[~positive].sum())
+        
+        keys = np.ceil(np.log(values[positive]) / self._log_gamma).astype(np.int64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        for key, weight in zip(unique_keys.tolist(), np.bincount(inverse, weights=weights[positive]).tolist()):
+            self.buckets[key] = self.buckets.get(key, 0.0) + weight
+    
+    def merge(self, other: "QuantileSketch") -> None:
+        """Fold another sketch into this one."""
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.zero_weight += other.zero_weight
+        for key, weight in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0.0) + weight
+    
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0 to 1)."""
+        total = self.total_weight
+        if total == 0:
+            return 0.0
+        
+        rank = q * total
+        cumulative = self.zero_weight
+        if cumulative >= rank and self.zero_weight > 0:
+            return 0.0
+        
+        keys = sorted(self.buckets)
+        for key in keys:
+            cumulative += self.buckets[key]
+            if cumulative >= rank:
+                break
+        return 2 * self.gamma ** key / (self.gamma + 1)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "alpha": self.alpha,
+            "zero_weight": self.zero_weight,
+            "buckets": [[key, weight] for key, weight in sorted(self.buckets.items())]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["alpha"])
+        sketch.zero_weight = data["zero_weight"]
+        sketch.buckets = {int(key): weight for key, weight in data["buckets"]}
+        return sketch
+
+class PayoutStats:
+    """
+    Weighted streaming statistics of payout multipliers.
+    
+    Mean and variance follow Welford's update, and batches and other
+    accumulators are combined with Chan's parallel formula. Merging is
+    therefore exact, whatever the order. Weights act as frequencies:
+    unweighted spins have weight 1, and lookup-table weights can be used
+    directly.
+    """
+    
+    def __init__(self, bin_edges: Sequence[float] = DEFAULT_BIN_EDGES, sketch_alpha: float = 0.01):
+        self.bin_edges = tuple(bin_edges)
+        self.count = 0
+        self.total_weight = 0.0
+        self.total_weight_sq = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hit_weight = 0.0
+        self.max = 0.0
+        self.histogram = np.zeros(len(self.bin_edges) + 1, dtype=np.float64)
+        self.sketch = QuantileSketch(sketch_alpha)
+    
+    def _combine(self, count: int, weight: float, weight_sq: float, mean: float, m2: float) -> None:
+        if weight == 0:
+            self.count += count
+            return
+        total = self.total_weight + weight
+        delta = mean - self.mean
+        self.mean += delta * weight / total
+        self.m2 += m2 + delta * delta * self.total_weight * weight / total
+        self.total_weight = total
+        self.total_weight_sq += weight_sq
+        self.count += count
+    
+    def update(self, payout: float, weight: float = 1.0) -> None:
+        """Add one spin."""
+        self._combine(1, weight, weight * weight, payout, 0.0)
+        if payout > 0:
+            self.hit_weight += weight
+        self.max = max(self.max, payout)
+        self.histogram[bisect.bisect_left(self.bin_edges, payout)] += weight
+        self.sketch.add(payout, weight)
+    
+    def update_batch(self, payouts: np.ndarray, weights: np.ndarray = None) -> None:
+        """Add an array of spins, optionally weighted."""
+        payouts = np.asarray(payouts, dtype=np.float64)
+        if len(payouts) == 0:
+            return
+        weights = np.ones(len(payouts)) if weights is None else np.asarray(weights, dtype=np.float64)
+        
+        weight = float(weights.sum())
+        mean = float(weights @ payouts) / weight if weight else 0.0
+        deviations = payouts - mean
+        self._combine(len(payouts), weight, float(weights @ weights), mean, float(weights @ (deviations * deviations)))
+        
+        self.hit_weight += float(weights[payouts > 0].sum())
+        self.max = max(self.max, float(payouts.max()))
+        self.histogram += np.bincount(
+            np.searchsorted(self.bin_edges, payouts, side='left'),
+            weights=weights,
+            minlength=len(self.histogram)
+        )
+        self.sketch.add_batch(payouts, weights)
+    
+    def merge(self, other: "PayoutStats") -> "PayoutStats":
+        """Fold another accumulator into this one and return self."""
+        if other.bin_edges != self.bin_edges:
+            raise ValueError("Cannot merge statistics with different histogram bins")
+        self._combine(other.count, other.total_weight, other.total_weight_sq, other.mean, other.m2)
+        self.hit_weight += other.hit_weight
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        self.sketch.merge(other.sketch)
+        return self
+    
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.total_weight if self.total_weight else 0.0
+    
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+    
+    @property
+    def effective_count(self) -> float:
+        """Kish effective sample size; equals count when unweighted."""
+        return self.total_weight ** 2 / self.total_weight_sq if self.total_weight_sq else 0.0
+    
+    def confidence_interval(self, z: float = CONFIDENCE_Z) -> List[float]:
+        """Confidence interval of the mean payout."""
+        n = self.effective_count
+        margin = z * self.std / math.sqrt(n) if n else 0.0
+        return [self.mean - margin, self.mean + margin]
+    
+    def hit_frequency_interval(self, z: float = CONFIDENCE_Z) -> List[float]:
+        """Confidence interval of the hit frequency (normal approximation)."""
+        n = self.effective_count
+        rate = self.hit_weight / self.total_weight if self.total_weight else 0.0
+        margin = z * math.sqrt(rate * (1 - rate) / n) if n else 0.0
+        return [rate - margin, rate + margin]
+    
+    def precision(self, z: float = CONFIDENCE_Z) -> Dict[str, float]:
+        """Half-widths of the RTP and hit frequency intervals, in percentage points."""
+        rtp_low, rtp_high = self.confidence_interval(z)
+        hit_low, hit_high = self.hit_frequency_interval(z)
+        return {"rtp": (rtp_high - rtp_low) * 50, "hit_frequency": (hit_high - hit_low) * 50}
+    
+    def volatility_class(self) -> str:
+        for limit, name in VOLATILITY_CLASSES:
+            if self.std < limit:
+                return name
+        return "Very High"
+    
+    def histogram_labels(self) -> List[str]:
+        """Readable label for each histogram bin."""
+        labels = []
+        lower = None
+        for edge in self.bin_edges:
+            labels.append(f"{edge:g}x" if lower is None else f"{lower:g}-{edge:g}x")
+            lower = edge
+        labels.append(f"{lower:g}x+")
+        return labels
+    
+    def summary(self, quantiles: Sequence[float] = (0.5, 0.9, 0.99, 0.999, 0.9999)) -> Dict[str, Any]:
+        """Statistics for PAR sheets, with RTP and rates in percent."""
+        low, high = self.confidence_interval()
+        hit_low, hit_high = self.hit_frequency_interval()
+        total = self.total_weight or 1.0
+        return {
+            "simulations": self.count,
+            "total_weight": self.total_weight,
+            "winning_weight": self.hit_weight,
+            "rtp_percent": self.mean * 100,
+            "rtp_confidence_interval_95": [low * 100, high * 100],
+            "hit_frequency_percent": self.hit_weight / total * 100,
+            "hit_frequency_confidence_interval_95": [hit_low * 100, hit_high * 100],
+            "max_win_multiplier": self.max,
+            "average_win_multiplier": self.mean * total / self.hit_weight if self.hit_weight else 0.0,
+            "variance": self.variance,
+            "standard_deviation": self.std,
+            "volatility_index": VOLATILITY_INDEX_Z * self.std,
+            "volatility": self.volatility_class(),
+            "payout_percentiles": {f"p{q * 100:g}": self.sketch.quantile(q) for q in quantiles},
+            "payout_distribution_percent": {
+                label: weight / total * 100
+                for label, weight in zip(self.histogram_labels(), self.histogram.tolist())
+            }
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable state, restorable with `from_dict`."""
+        return {
+            "bin_edges": list(self.bin_edges),
+            "count": self.count,
+            "total_weight": self.total_weight,
+            "total_weight_sq": self.total_weight_sq,
+            "mean": self.mean,
+            "m2": self.m2,
+            "hit_weight": self.hit_weight,
+            "max": self.max,
+            "histogram": self.histogram.tolist(),
+            "sketch": self.sketch.to_dict()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PayoutStats":
+        stats = cls(data["bin_edges"], data["sketch"]["alpha"])
+        for key in ("count", "total_weight", "total_weight_sq", "mean", "m2", "hit_weight", "max"):
+            setattr(stats, key, data[key])
+        stats.histogram = np.array(data["histogram"], dtype=np.float64)
+        stats.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stats
@@ -7,63 +7,454 @@ Handles game requests and returns properly formatted responses.
 import sys
 import json
 import os
+import signal
+import socketserver
+import subprocess
+import threading
+import itertools
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Any, Dict, IO, List
+
 
 # Add the games directory to path
 sys.path.append(str(Path(__file__).parent.parent / "games" / "slot_3x5"))
+sys.path.append(str(Path(__file__).parent))
+
+from gamestate import spin
+import instrumentation
+import spin_rng
+from spin_rng import CounterRNG, SpinKey
+from spin_batch import run_spins_batch, iter_compact_results
+from game_config import CompiledGameConfig, load_config
+from lookup_play import LookupTablePlayer, default_paths
 
-from gamestate import run_spin
-from game_config import GameConfig
+# Lookup-table play reads these, falling back to run.py's output for "base"
+LOOKUP_TABLE_ENV = "STAKE_LOOKUP_TABLE"
+BOOKS_ENV = "STAKE_BOOKS"
 
-def handle_play_request(bet_amount: float) -> dict:
+_lookup_player = None
+_lookup_player_lock = threading.Lock()
+
+def handle_play_request(bet_amount: float, config: CompiledGameConfig = None) -> dict:
     """
     Handle a play request and return Stake Engine compatible response.
     
     Args:
         bet_amount: The bet amount for this spin
+        config: Compiled game configuration (shared process config when omitted)
     
     Returns:
         Dictionary containing game result in Stake Engine format
     """
     try:
-        config = GameConfig()
+        config = config or load_config()
         
         # Validate bet amount
         if bet_amount < config.min_bet or bet_amount > config.max_bet:
             raise ValueError(f"Bet amount must be between {config.min_bet} and {config.max_bet}")
         
-        # Run the spin
-        result = run_spin(config)
+        # Run the spin; its id is the RNG counter, and with the stream (and
+        # the server-side seed) it can be replayed exactly
+        rng = spin_rng.default_rng()
+        outcome = spin(config, rng)
         
-        # Scale payout by bet amount
-        scaled_payout = result["payoutMultiplier"] * bet_amount
+        # Events are built once, already scaled by the bet
+        if not instrumentation.ENABLED:
+            result = outcome.to_dict(bet_amount)
+        else:
+            start = instrumentation.now()
+            result = outcome.to_dict(bet_amount)
+            instrumentation.observe("build_events", start)
         
-        # Update events with scaled amounts
-        for event in result["events"]:
-            if event["type"] == "winInfo":
-                event["totalWin"] = scaled_payout
-                for win in event["wins"]:
-                    win["win"] = win["win"] * bet_amount
-            
-            elif event["type"] in ["setWin", "setTotalWin", "finalWin"]:
-                event["amount"] = scaled_payout
+        result["rngStream"] = rng.stream
+        return result
         
-        # Update payout multiplier to actual win amount
-        result["payoutMultiplier"] = scaled_payout
-        result["baseGameWins"] = scaled_payout
+    except Exception as e:
+        return error_result(e)
+
+def handle_lookup_play_request(bet_amount: float, player: LookupTablePlayer = None, config: CompiledGameConfig = None) -> dict:
+    """
+    Handle a play request by drawing a pre-generated outcome from the lookup table.
+    
+    The outcome is drawn by its optimized weight in O(1) and scaled by the bet,
+    so the response has the same format as `handle_play_request`.
+    
+    Args:
+        bet_amount: The bet amount for this spin
+        player: Loaded lookup table and books (shared process player when omitted)
+        config: Compiled game configuration (shared process config when omitted)
+    
+    Returns:
+        Dictionary containing game result in Stake Engine format
+    """
+    try:
+        config = config or load_config()
         
+        # Validate bet amount
+        if bet_amount < config.min_bet or bet_amount > config.max_bet:
+            raise ValueError(f"Bet amount must be between {config.min_bet} and {config.max_bet}")
+        
+        player = player or get_lookup_player()
+        
+        if not instrumentation.ENABLED:
+            return scale_result(player.draw(), bet_amount)
+        
+        start = instrumentation.now()
+        result = player.draw()
+        instrumentation.observe("lookup_draw", start)
+        instrumentation.increment("lookup_spins")
+        
+        start = instrumentation.now()
+        scale_result(result, bet_amount)
+        instrumentation.observe("scale_result", start)
         return result
         
     except Exception as e:
-        return {
-            "error": str(e),
-            "id": 0,
-            "payoutMultiplier": 0,
-            "events": [],
-            "criteria": "error",
-            "baseGameWins": 0.0,
-            "freeGameWins": 0.0
-        }
+        return error_result(e)
+
+def handle_play_batch_request(bet_amount: float, count: int, config: CompiledGameConfig = None, rng: CounterRNG = None) -> dict:
+    """
+    Handle an autoplay request: run `count` spins in one engine call.
+    
+    Spins go through the batch kernel and come back as compact results
+    (board, winning lines and total win, scaled by the bet). Spin ids are
+    consecutive RNG counters on the returned rngStream.
+    
+    Args:
+        bet_amount: The bet amount for each spin
+        count: Number of spins
+        config: Compiled game configuration (shared process config when omitted)
+        rng: Counter-based generator (the process generator when omitted)
+    
+    Returns:
+        Dictionary with the spins, their totalWin and rngStream, or an error
+    """
+    try:
+        config = config or load_config()
+        
+        # Validate bet amount
+        if bet_amount < config.min_bet or bet_amount > config.max_bet:
+            raise ValueError(f"Bet amount must be between {config.min_bet} and {config.max_bet}")
+        if count < 1:
+            raise ValueError("Spin count must be at least 1")
+        
+        rng = rng or spin_rng.default_rng()
+        first_counter = rng.reserve(count)
+        
+        start = instrumentation.now() if instrumentation.ENABLED else 0
+        batch = run_spins_batch(config, count, rng, start_counter=first_counter)
+        if start:
+            instrumentation.observe("run_spins_batch", start)
+            instrumentation.increment("batch_spins", count)
+            start = instrumentation.now()
+        
+        spins = list(iter_compact_results(config, batch, bet_amount, start_id=first_counter))
+        if start:
+            instrumentation.observe("compact_results", start)
+        
+        return {"spins": spins, "totalWin": sum(spin["totalWin"] for spin in spins), "rngStream": rng.stream}
+        
+    except Exception as e:
+        return error_result(e)
+
+def handle_lookup_play_batch_request(bet_amount: float, count: int, player: LookupTablePlayer = None, config: CompiledGameConfig = None) -> dict:
+    """
+    Handle an autoplay request by drawing `count` outcomes from the lookup table.
+    
+    Returns the same compact format as `handle_play_batch_request`.
+    """
+    try:
+        config = config or load_config()
+        
+        # Validate bet amount
+        if bet_amount < config.min_bet or bet_amount > config.max_bet:
+            raise ValueError(f"Bet amount must be between {config.min_bet} and {config.max_bet}")
+        if count < 1:
+            raise ValueError("Spin count must be at least 1")
+        
+        player = player or get_lookup_player()
+        spins = [compact_result(player.draw(), bet_amount) for _ in range(count)]
+        
+        return {"spins": spins, "totalWin": sum(spin["totalWin"] for spin in spins)}
+        
+    except Exception as e:
+        return error_result(e)
+
+def handle_replay_request(key: SpinKey, bet_amount: float = 1.0, config: CompiledGameConfig = None) -> dict:
+    """
+    Rebuild the spin at `key` exactly, scaled by the bet.
+    
+    Works for live spins (id and rngStream of the result, seed of the
+    process) and for simulations (master seed, mode stream, simulation id).
+    """
+    try:
+        config = config or load_config()
+        
+        result = spin(config, CounterRNG(key.seed, key.stream), key.counter).to_dict(bet_amount)
+        result["rngStream"] = key.stream
+        
+        return result
+        
+    except Exception as e:
+        return error_result(e)
+
+def compact_result(result: dict, bet_amount: float = 1.0) -> dict:
+    """Compact form of a unit-bet result: board, winning lines and total win, scaled by the bet."""
+    board = []
+    wins = []
+    for event in result["events"]:
+        if event["type"] == "reveal":
+            board = event["board"]
+        elif event["type"] == "winInfo":
+            wins = [
+                {
+                    "symbol": win["symbol"],
+                    "kind": win["kind"],
+                    "win": win["win"] * bet_amount,
+                    "positions": win["positions"]
+                } for win in event["wins"]
+            ]
+    
+    return {
+        "id": result["id"],
+        "board": board,
+        "wins": wins,
+        "totalWin": result["payoutMultiplier"] * bet_amount
+    }
+
+def get_lookup_player() -> LookupTablePlayer:
+    """Lookup-table player shared by the process, loaded on first use."""
+    global _lookup_player
+    
+    with _lookup_player_lock:
+        if _lookup_player is None:
+            paths = default_paths()
+            _lookup_player = LookupTablePlayer(
+                os.environ.get(LOOKUP_TABLE_ENV, paths["lookup_table"]),
+                os.environ.get(BOOKS_ENV, paths["books"])
+            )
+    
+    return _lookup_player
+
+def scale_result(result: dict, bet_amount: float) -> dict:
+    """Scale a unit-bet result and its events by the bet amount, in place."""
+    # Scale payout by bet amount
+    scaled_payout = result["payoutMultiplier"] * bet_amount
+    
+    # Update events with scaled amounts
+    for event in result["events"]:
+        if event["type"] == "winInfo":
+            event["totalWin"] = scaled_payout
+            for win in event["wins"]:
+                win["win"] = win["win"] * bet_amount
+        
+        elif event["type"] in ["setWin", "setTotalWin", "finalWin"]:
+            event["amount"] = scaled_payout
+    
+    # Update payout multiplier to actual win amount
+    result["payoutMultiplier"] = scaled_payout
+    result["baseGameWins"] = scaled_payout
+    
+    return result
+
+def error_result(error: Exception) -> dict:
+    """Stake Engine shaped response for a failed request."""
+    if instrumentation.ENABLED:
+        instrumentation.increment("request_errors")
+    
+    return {
+        "error": str(error),
+        "id": 0,
+        "payoutMultiplier": 0,
+        "events": [],
+        "criteria": "error",
+        "baseGameWins": 0.0,
+        "freeGameWins": 0.0
+    }
+
+def get_config_data(config: CompiledGameConfig) -> dict:
+    """Public game configuration returned by the `config` command."""
+    return {
+        "reels": config.reels,
+        "rows": config.rows,
+        "paylines": len(config.paylines),
+        "symbols": list(config.symbols),
+        "target_rtp": config.target_rtp,
+        "min_bet": config.min_bet,
+        "max_bet": config.max_bet,
+        "max_win_multiplier": config.max_win_multiplier
+    }
+
+def encode_response(response: Any) -> str:
+    """Serialise a response to JSON, timed as the "serialize" stage when instrumented."""
+    if not instrumentation.ENABLED:
+        return json.dumps(response)
+    
+    start = instrumentation.now()
+    encoded = json.dumps(response)
+    instrumentation.observe("serialize", start)
+    return encoded
+
+def get_metrics() -> str:
+    """Stage timings and counters of this process in Prometheus text format."""
+    return instrumentation.render()
+
+def handle_request(request: Dict[str, Any], config: CompiledGameConfig) -> dict:
+    """
+    Handle one worker request and return its response.
+    
+    Requests look like {"id": 7, "command": "play", "bet": 1.0}. The id is
+    echoed back so clients can pipeline requests and match responses.
+    """
+    command = request.get("command", "play")
+    
+    if command == "play":
+        response = {"result": handle_play_request(float(request.get("bet", 1.0)), config)}
+    elif command == "play_lookup":
+        response = {"result": handle_lookup_play_request(float(request.get("bet", 1.0)), config=config)}
+    elif command == "play_batch":
+        response = {"result": handle_play_batch_request(float(request.get("bet", 1.0)), int(request.get("count", 1)), config)}
+    elif command == "replay":
+        response = {"result": handle_replay_request(SpinKey.parse(str(request.get("key"))), float(request.get("bet", 1.0)), config)}
+    elif command == "config":
+        response = {"result": get_config_data(config)}
+    else:
+        response = {"error": f"Unknown command: {command}"}
+    
+    response["id"] = request.get("id")
+    return response
+
+def serve_stream(reader: IO[str], writer: IO[str], config: CompiledGameConfig) -> None:
+    """
+    Answer newline-delimited JSON requests until the reader is exhausted.
+    
+    Responses are written in request order, one JSON object per line. A
+    request that fails still gets a reply carrying its id (None when the
+    line is not a JSON object), so one bad request cannot stall its client.
+    """
+    for line in reader:
+        if not line.strip():
+            continue
+        
+        request_id = None
+        try:
+            request = json.loads(line)
+            # Read before validating so an error reply can still be matched
+            request_id = request.get("id")
+            response = handle_request(request, config)
+        except (ValueError, TypeError, AttributeError, KeyError, OverflowError) as e:
+            response = {"id": request_id, "error": f"Invalid request: {e}"}
+        
+        writer.write(encode_response(response) + '\n')
+        writer.flush()
+
+def serve_socket(socket_path: str, config: CompiledGameConfig) -> None:
+    """Serve newline-delimited JSON requests on a Unix socket, one thread per connection."""
+    class RequestHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            # Separate files: a read-write text file drops read-ahead on write
+            with self.request.makefile('r', encoding='utf-8') as reader, \
+                    self.request.makefile('w', encoding='utf-8') as writer:
+                serve_stream(reader, writer, config)
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    
+    # Exit through the finally block on SIGTERM so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    with socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler) as server:
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+class EngineWorkerPool:
+    """
+    Pool of long-lived `slot_engine.py serve` worker processes.
+    
+    Requests are pipelined: `submit` writes to the least-loaded worker and
+    returns a Future that a per-worker reader thread resolves when the
+    matching response arrives.
+    """
+    
+    def __init__(self, num_workers: int = None, python: str = sys.executable):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._workers: List[Dict[str, Any]] = []
+        
+        for _ in range(self.num_workers):
+            process = subprocess.Popen(
+                [python, str(Path(__file__).resolve()), "serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
+            worker = {"process": process, "pending": {}, "lock": threading.Lock()}
+            worker["reader"] = threading.Thread(target=self._read_responses, args=(worker,), daemon=True)
+            worker["reader"].start()
+            self._workers.append(worker)
+    
+    def _read_responses(self, worker: Dict[str, Any]) -> None:
+        for line in worker["process"].stdout:
+            response = json.loads(line)
+            with worker["lock"]:
+                pending = worker["pending"]
+                future = pending.pop(response.get("id"), None)
+                unmatched = future is None and bool(pending)
+                # Workers reply in request order, so a reply without a usable
+                # id answers the oldest request still waiting
+                if unmatched:
+                    future = pending.pop(next(iter(pending)))
+            if unmatched:
+                future.set_exception(RuntimeError(response.get("error", "Unmatched engine response")))
+            elif future is not None:
+                future.set_result(response)
+        
+        # Worker exited; fail anything still waiting on it
+        with worker["lock"]:
+            pending, worker["pending"] = worker["pending"], {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Engine worker exited"))
+    
+    def submit(self, request: Dict[str, Any]) -> Future:
+        """Send a request to the least-loaded worker without waiting for the reply."""
+        future = Future()
+        request = dict(request, id=next(self._ids))
+        
+        with self._lock:
+            worker = min(self._workers, key=lambda w: len(w["pending"]))
+            with worker["lock"]:
+                worker["pending"][request["id"]] = future
+            worker["process"].stdin.write(json.dumps(request) + '\n')
+            worker["process"].stdin.flush()
+        
+        return future
+    
+    def play(self, bet_amount: float) -> dict:
+        """Play one spin on the pool and wait for the result."""
+        response = self.submit({"command": "play", "bet": bet_amount}).result()
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+    
+    def close(self) -> None:
+        """Stop all workers after they finish outstanding requests."""
+        for worker in self._workers:
+            worker["process"].stdin.close()
+        for worker in self._workers:
+            worker["process"].wait()
+            worker["reader"].join()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
 def main():
     """Main entry point for the slot engine."""
@@ -77,20 +468,33 @@ def main():
         bet_amount = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
         result = handle_play_request(bet_amount)
         print(json.dumps(result))
+    
+    elif command == "play-lookup":
+        bet_amount = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+        result = handle_lookup_play_request(bet_amount)
+        print(json.dumps(result))
         
+    elif command == "replay":
+        # Key is seed:stream:counter, or stream:counter with the seed from
+        # STAKE_RNG_SEED or the seed log
+        if len(sys.argv) < 3:
+            print(json.dumps({"error": "Usage: slot_engine.py replay <seed:stream:counter> [bet]"}))
+            sys.exit(1)
+        bet_amount = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        result = handle_replay_request(SpinKey.parse(sys.argv[2]), bet_amount)
+        print(json.dumps(result))
+    
     elif command == "config":
-        config = GameConfig()
-        config_data = {
-            "reels": config.reels,
-            "rows": config.rows,
-            "paylines": len(config.paylines),
-            "symbols": config.symbols,
-            "target_rtp": config.target_rtp,
-            "min_bet": config.min_bet,
-            "max_bet": config.max_bet,
-            "max_win_multiplier": config.max_win_multiplier
-        }
-        print(json.dumps(config_data))
+        print(json.dumps(get_config_data(load_config())))
+    
+    elif command == "serve":
+        # Long-lived worker: answer requests until stdin closes or, with
+        # --socket, until interrupted
+        config = load_config()
+        if len(sys.argv) > 3 and sys.argv[2] == "--socket":
+            serve_socket(sys.argv[3], config)
+        else:
+            serve_stream(sys.stdin, sys.stdout, config)
         
     else:
         print(json.dumps({"error": f"Unknown command: {command}"}))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Vectorized lookup-table weight optimizer for Stake Engine compliance.
+Solves for weights that hit a target RTP, hit frequency and payout-bucket mix.
+"""
+
+import sys
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from lookup_columns import load_lookup_columns, save_lookup_table
+
+# Optimized weights sum to this total. It leaves every row plenty of
+# resolution while keeping cumulative weights exact in float64 (< 2**53).
+DEFAULT_TOTAL_WEIGHT = 2 ** 44
+
+def build_features(payouts: np.ndarray, target_rtp: float, target_hit_frequency: float = None,
+                   payout_buckets: Sequence[Tuple[float, float, float]] = None) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Build the constraint features of each payout and their target means.
+    
+    Args:
+        payouts: Payout multipliers
+        target_rtp: Target RTP in percent
+        target_hit_frequency: Target share of winning outcomes in percent
+        payout_buckets: (low, high, percent) targets for low <= payout < high
+    
+    Returns:
+        Tuple of (features, targets, names), features having one column per constraint
+    """
+    columns = [payouts]
+    targets = [target_rtp / 100]
+    names = ["rtp"]
+    
+    if target_hit_frequency is not None:
+        columns.append((payouts > 0).astype(np.float64))
+        targets.append(target_hit_frequency / 100)
+        names.append("hit_frequency")
+    
+    for low, high, percent in payout_buckets or []:
+        columns.append(((payouts >= low) & (payouts < high)).astype(np.float64))
+        targets.append(percent / 100)
+        names.append(f"bucket_{low:g}_{high:g}")
+    
+    return np.column_stack(columns), np.array(targets), names
+
+def solve_distribution(base: np.ndarray, features: np.ndarray, targets: np.ndarray,
+                       tolerance: float = 1e-10, max_iterations: int = 100) -> np.ndarray:
+    """
+    Find the distribution closest to `base` whose feature means equal `targets`.
+    
+    The minimum relative-entropy solution is an exponential tilt of the base,
+    p ∝ base * exp(features @ λ), found by Newton's method on the convex dual.
+    Distinct payouts share one row, so the system stays small whatever the
+    table size.
+    
+    Args:
+        base: Base probabilities (summing to 1)
+        features: One row per outcome, one column per constraint
+        targets: Target mean of each feature column
+        tolerance: Largest allowed error in any feature mean, relative to
+            that feature's largest deviation from its target
+        max_iterations: Newton step limit
+    
+    Returns:
+        Array of probabilities
+    
+    Raises:
+        ValueError: If the targets cannot be met
+    """
+    support = base > 0
+    log_base = np.where(support, np.log(np.where(support, base, 1.0)), -np.inf)
+    centered = features - targets
+    allowed = tolerance * np.maximum(np.abs(centered).max(axis=0), 1.0)
+    
+    def tilt(lam: np.ndarray) -> Tuple[float, np.ndarray]:
+        exponents = log_base + centered @ lam
+        shift = exponents.max()
+        scaled = np.exp(exponents - shift)
+        total = scaled.sum()
+        return shift + np.log(total), scaled / total
+    
+    lam = np.zeros(features.shape[1])
+    objective, probabilities = tilt(lam)
+    
+    for _ in range(max_iterations):
+        gradient = probabilities @ centered
+        if np.all(np.abs(gradient) <= allowed):
+            return probabilities
+        
+        weighted = centered * probabilities[:, None]
+        hessian = centered.T @ weighted - np.outer(gradient, gradient)
+        step = np.linalg.lstsq(hessian, -gradient, rcond=None)[0]
+        
+        # Backtracking keeps every step a descent step on the dual
+        scale = 1.0
+        while scale > 1e-12:
+            candidate_objective, candidate = tilt(lam + scale * step)
+            if candidate_objective <= objective + 1e-4 * scale * (gradient @ step):
+                break
+            scale /= 2
+        else:
+            break
+        
+        lam = lam + scale * step
+        objective, probabilities = candidate_objective, candidate
+    
+    gradient = probabilities @ centered
+    if np.all(np.abs(gradient) <= allowed):
+        return probabilities
+    
+    raise ValueError(f"Targets cannot be met by these outcomes (closest means miss by {np.abs(gradient).max():.3g})")
+
+def round_weights(probabilities: np.ndarray, total_weight: int) -> np.ndarray:
+    """
+    Round probabilities to integer weights summing exactly to `total_weight`.
+    
+    Uses largest remainders, so each weight is within 1 of its exact share.
+    """
+    exact = probabilities * total_weight
+    weights = np.floor(exact).astype(np.int64)
+    shortfall = total_weight - int(weights.sum())
+    if shortfall > 0:
+        weights[np.argsort(weights - exact, kind='stable')[:shortfall]] += 1
+    return weights
+
+def optimize_weight_arrays(payouts: np.ndarray, weights: np.ndarray, target_rtp: float,
+                           target_hit_frequency: float = None,
+                           payout_buckets: Sequence[Tuple[float, float, float]] = None,
+                           total_weight: int = DEFAULT_TOTAL_WEIGHT,
+                           min_weight: int = 1) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Optimize lookup-table weights to meet RTP, hit frequency and bucket targets.
+    
+    Outcomes sharing a payout are interchangeable for every constraint, so
+    the solve runs on distinct payouts. Each payout's weight is then spread
+    over its outcomes in proportion to their current weights, rounding
+    cumulatively so the payout keeps exactly its integer share.
+    
+    Args:
+        payouts: Payout multiplier per outcome
+        weights: Current weight per outcome; zero-weight outcomes stay unused
+        target_rtp: Target RTP in percent
+        target_hit_frequency: Target hit frequency in percent, or None to leave free
+        payout_buckets: (low, high, percent) targets for low <= payout < high
+        total_weight: Sum of the optimized weights
+        min_weight: Smallest weight given to any outcome that had weight
+    
+    Returns:
+        Tuple of (integer weights, stats); stats reports the achieved RTP, hit
+        frequency and bucket shares and the bound on RTP rounding error
+    """
+    payouts = np.asarray(payouts, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    
+    # Group outcomes by payout in one sort
+    order = np.argsort(payouts, kind='stable')
+    sorted_payouts = payouts[order]
+    starts = np.flatnonzero(np.r_[True, sorted_payouts[1:] != sorted_payouts[:-1]])
+    group_payouts = sorted_payouts[starts]
+    group_weights = np.add.reduceat(weights[order], starts)
+    
+    # Every used outcome keeps min_weight; the targets left for the rest of
+    # the weight account for that floor exactly
+    group_floors = min_weight * np.add.reduceat((weights[order] > 0).astype(np.int64), starts)
+    free_weight = total_weight - int(group_floors.sum())
+    if free_weight <= 0:
+        raise ValueError(f"Total weight {total_weight} is too small for a minimum weight of {min_weight}")
+    
+    features, targets, names = build_features(group_payouts, target_rtp, target_hit_frequency, payout_buckets)
+    free_targets = (targets * total_weight - group_floors @ features) / free_weight
+    probabilities = solve_distribution(group_weights / group_weights.sum(), features, free_targets)
+    free_totals = round_weights(probabilities, free_weight)
+    group_totals = group_floors + free_totals
+    
+    # Cumulative rounding within each payout group: rows keep their relative
+    # weights and every group sums exactly to its integer total
+    sorted_weights = weights[order]
+    group_of_row = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(payouts)]))
+    cumulative = np.cumsum(sorted_weights)
+    before_group = (cumulative[starts] - sorted_weights[starts])[group_of_row]
+    row_group_weights = group_weights[group_of_row]
+    share = np.divide(cumulative - before_group, row_group_weights, out=np.zeros(len(payouts)), where=row_group_weights > 0)
+    rounded = np.floor(share * free_totals[group_of_row] + 0.5).astype(np.int64)
+    ends = np.r_[starts[1:], len(payouts)] - 1
+    rounded[ends] = free_totals
+    
+    sorted_new = np.diff(np.r_[0, rounded])
+    sorted_new[starts] = rounded[starts]
+    sorted_new += np.where(sorted_weights > 0, min_weight, 0)
+    
+    new_weights = np.empty(len(payouts), dtype=np.int64)
+    new_weights[order] = sorted_new
+    
+    achieved = group_totals @ features / total_weight
+    stats = {name: float(value) * 100 for name, value in zip(names, achieved)}
+    # Each payout's total is within 1 of its exact share
+    stats["rtp_rounding_bound"] = float(np.abs(group_payouts).sum()) / total_weight * 100
+    stats["total_weight"] = int(total_weight)
+    stats["distinct_payouts"] = int(len(starts))
+    
+    return new_weights, stats
+
+def optimize_lookup_table(lookup_file: str, output_file: str, target_rtp: float,
+                          target_hit_frequency: float = None,
+                          payout_buckets: Sequence[Tuple[float, float, float]] = None,
+                          total_weight: int = DEFAULT_TOTAL_WEIGHT,
+                          min_weight: int = 1) -> Dict[str, Any]:
+    """Optimize a lookup table and write the result as CSV and columns; returns the stats."""
+    table = load_lookup_columns(lookup_file)
+    new_weights, stats = optimize_weight_arrays(
+        table.payout, table.weight, target_rtp, target_hit_frequency, payout_buckets, total_weight, min_weight
+    )
+    save_lookup_table(output_file, table.with_weights(new_weights))
+    return stats
+
+def main():
+    """Optimize a lookup table from the command line."""
+    if len(sys.argv) < 3:
+        print("Usage: python weight_optimizer.py <lookup_table_file> <target_rtp> [target_hit_frequency]")
+        sys.exit(1)
+    
+    lookup_file = sys.argv[1]
+    target_rtp = float(sys.argv[2])
+    target_hit_frequency = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    output_file = lookup_file.replace('.csv', '_optimized.csv')
+    
+    stats = optimize_lookup_table(lookup_file, output_file, target_rtp, target_hit_frequency)
+    print(f"RTP: {stats['rtp']:.6f}% (rounding bound {stats['rtp_rounding_bound']:.2e}%)")
+    if "hit_frequency" in stats:
+        print(f"Hit Frequency: {stats['hit_frequency']:.6f}%")
+    print(f"Optimized lookup table saved to: {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
+import os
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from math_engine import slot_engine
+from server.rtp_monitor import RTPMonitor
+from server.wallet import InsufficientBalance, WalletStore
 
 app = FastAPI()
 
+# Compiled once per process and shared by every request
+config = slot_engine.load_config()
+
+# "simulate" spins the reels per request; "lookup" serves pre-generated
+# outcomes drawn by their optimized lookup-table weights
+PLAY_MODE = os.environ.get("STAKE_PLAY_MODE", "simulate")
+if PLAY_MODE not in ("simulate", "lookup"):
+    raise ValueError(f"Unknown STAKE_PLAY_MODE: {PLAY_MODE}")
+
 # Allow frontend to talk to backend
 app.add_middleware(
     CORSMiddleware,
@@ -13,23 +27,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-balance = 1000  # simple in-memory balance
+# Most spins one autoplay request may settle
+MAX_BATCH_SPINS = 1000
+
+# In-memory per-player balances; players start with 1000
+wallets = WalletStore(initial_balance=1000)
+
+# Realised RTP of settled spins, checked against the configured target
+monitor = RTPMonitor(config.target_rtp)
+
+def engine_response(payload: dict) -> Response:
+    # Spin results are plain JSON already; serialise them directly (and time
+    # it when instrumentation is on) instead of through FastAPI's encoder
+    return Response(slot_engine.encode_response(payload), media_type="application/json")
 
 @app.post("/api/stake/play")
-def play_game(bet: int = 10):
-    global balance
-    if bet > balance:
-        return {"error": "Insufficient balance"}
+def play_game(bet: int = 10, player_id: str = "default"):
+    # Debit first so concurrent spins cannot spend the same balance twice
+    try:
+        wallets.place_bet(player_id, bet)
+    except InsufficientBalance as e:
+        return {"error": str(e)}
     
-    result = slot_engine.play_spin(bet)  # your math engine function
-    win_amount = result.get("win", 0)
-    balance += win_amount - bet
-
-    return {
+    if PLAY_MODE == "lookup":
+        result = slot_engine.handle_lookup_play_request(bet, config=config)
+    else:
+        result = slot_engine.handle_play_request(bet, config)
+    if "error" in result:
+        wallets.settle(player_id, bet)  # refund
+        return {"error": result["error"]}
+    
+    win_amount = result["payoutMultiplier"]  # already scaled by the bet
+    balance = wallets.settle(player_id, win_amount)
+    monitor.record(bet, win_amount)
+    
+    return engine_response({
         "balance": balance,
         "result": result
+    })
+
+@app.post("/api/stake/play-batch")
+def play_batch(bet: int = 10, count: int = 10, player_id: str = "default"):
+    if count < 1 or count > MAX_BATCH_SPINS:
+        return {"error": f"Spin count must be between 1 and {MAX_BATCH_SPINS}"}
+    
+    # Spins are paid up front: as many as the balance covers, up to count
+    played = wallets.place_bets(player_id, bet, count)
+    if played == 0:
+        return {"error": "Insufficient balance"}
+    
+    if PLAY_MODE == "lookup":
+        result = slot_engine.handle_lookup_play_batch_request(bet, played, config=config)
+    else:
+        result = slot_engine.handle_play_batch_request(bet, played, config)
+    if "error" in result:
+        wallets.settle(player_id, bet * played)  # refund
+        return {"error": result["error"]}
+    
+    balance = wallets.settle(player_id, result["totalWin"])
+    monitor.record_many(bet, [spin["totalWin"] for spin in result["spins"]])
+    
+    response = {
+        "balance": balance,
+        "spinsPlayed": played,
+        "totalWin": result["totalWin"],
+        "spins": result["spins"]
     }
+    # Simulated spins replay from their stream; lookup draws have none
+    if "rngStream" in result:
+        response["rngStream"] = result["rngStream"]
+    return engine_response(response)
 
 @app.get("/api/stake/balance")
-def get_balance():
-    return {"balance": balance}
+def get_balance(player_id: str = "default"):
+    return {"balance": wallets.balance(player_id)}
+
+@app.get("/api/stake/rtp-monitor")
+def get_rtp_monitor():
+    return monitor.snapshot()
+
+# Stage timings and counters; empty unless STAKE_INSTRUMENTATION is set
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(slot_engine.get_metrics(), media_type="text/plain; version=0.0.4")
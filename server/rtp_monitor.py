@@ -0,0 +1,144 @@
+"""
+Live RTP monitor for the game server.
+Tracks realised RTP, hit rate and win levels per spin and flags drift from
+the configured target with an approximately always-valid sequential test.
+"""
+
+import math
+import threading
+from typing import Any, Dict, List
+
+from math_engine.sim_stats import PayoutStats
+
+# Win levels as upper edges of the win multiplier: no win, up to 1x, 5x,
+# 20x, 100x, then above
+WIN_LEVEL_EDGES = (0, 1, 5, 20, 100)
+
+class DriftTest:
+    """
+    Mixture sequential probability ratio test of mean payout against a target.
+    
+    The likelihood ratio averages a normal alternative over a N(target, tau^2)
+    prior on the true mean. Drift is flagged once the ratio reaches 1 / alpha,
+    and the test may be checked after every spin.
+    
+    With a known variance the false alarm rate would be at most `alpha`.
+    Here the variance is a plug-in estimate from the spins so far, so the
+    test is only approximately always-valid. Heavy-tailed payouts
+    understate the variance until rare big wins arrive, and
+    `min_spins` holds the test back until the estimate has settled.
+    """
+    
+    def __init__(self, target: float, alpha: float = 0.001, tau: float = 0.05, min_spins: int = 1000):
+        self.target = target
+        self.alpha = alpha
+        self.tau_sq = tau * tau
+        self.min_spins = min_spins
+        self.log_threshold = -math.log(alpha)
+        self.log_ratio = 0.0
+        self.max_log_ratio = 0.0
+        self.flagged_at = None
+    
+    def update(self, stats: PayoutStats) -> None:
+        """Re-evaluate the test after the accumulator has taken a spin."""
+        n = stats.count
+        variance = stats.variance
+        if n < self.min_spins or variance <= 0:
+            return
+        
+        spread = variance + n * self.tau_sq
+        deviation = stats.mean - self.target
+        self.log_ratio = 0.5 * math.log(variance / spread) + (n * n * self.tau_sq * deviation * deviation) / (2 * variance * spread)
+        self.max_log_ratio = max(self.max_log_ratio, self.log_ratio)
+        
+        if self.flagged_at is None and self.log_ratio >= self.log_threshold:
+            self.flagged_at = n
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "target_rtp_percent": self.target * 100,
+            "log_likelihood_ratio": self.log_ratio,
+            "log_threshold": self.log_threshold,
+            # Approximately always-valid p-value (plug-in variance): roughly the
+            # chance the ratio ever got this high on target
+            "p_value": min(1.0, math.exp(-self.max_log_ratio)),
+            "drifting": self.flagged_at is not None,
+            "flagged_at_spin": self.flagged_at
+        }
+
+class RTPMonitor:
+    """
+    Constant-time-per-spin RTP monitor, globally and per bet level.
+    
+    Statistics are kept on the win multiplier (win / bet) of each spin, so
+    per-level RTP is comparable across bets; the global money RTP
+    (total won / total bet) is reported alongside.
+    """
+    
+    def __init__(self, target_rtp: float, max_bet_levels: int = 64, **test_args):
+        self.target = target_rtp / 100
+        self.max_bet_levels = max_bet_levels
+        self.test_args = test_args
+        self._lock = threading.Lock()
+        self.total_bet = 0.0
+        self.total_win = 0.0
+        self.overall = self._new_scope()
+        self.bet_levels: Dict[str, Dict[str, Any]] = {}
+    
+    def _new_scope(self) -> Dict[str, Any]:
+        return {
+            "stats": PayoutStats(WIN_LEVEL_EDGES),
+            "test": DriftTest(self.target, **self.test_args)
+        }
+    
+    def record(self, bet: float, win: float) -> None:
+        """Record one settled spin."""
+        self.record_many(bet, [win])
+    
+    def record_many(self, bet: float, wins: List[float]) -> None:
+        """Record several settled spins at the same bet, taking the lock once."""
+        level = f"{bet:g}"
+        
+        with self._lock:
+            scope = self.bet_levels.get(level)
+            if scope is None:
+                # Bounded so unusual bet amounts cannot grow the monitor
+                level = level if len(self.bet_levels) < self.max_bet_levels else "other"
+                scope = self.bet_levels.setdefault(level, self._new_scope())
+            
+            for win in wins:
+                self.total_bet += bet
+                self.total_win += win
+                multiplier = win / bet if bet else 0.0
+                for target_scope in (self.overall, scope):
+                    target_scope["stats"].update(multiplier)
+                    target_scope["test"].update(target_scope["stats"])
+    
+    def _scope_summary(self, scope: Dict[str, Any]) -> Dict[str, Any]:
+        stats = scope["stats"]
+        summary = stats.summary(quantiles=(0.5, 0.99))
+        return {
+            "spins": stats.count,
+            "rtp_percent": summary["rtp_percent"],
+            "rtp_confidence_interval_95": summary["rtp_confidence_interval_95"],
+            "hit_frequency_percent": summary["hit_frequency_percent"],
+            "standard_deviation": summary["standard_deviation"],
+            "max_win_multiplier": summary["max_win_multiplier"],
+            "win_levels": {
+                label: int(count)
+                for label, count in zip(stats.histogram_labels(), stats.histogram.tolist())
+            },
+            "drift": scope["test"].summary()
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Current figures for every scope."""
+        with self._lock:
+            overall = self._scope_summary(self.overall)
+            overall["total_bet"] = self.total_bet
+            overall["total_win"] = self.total_win
+            overall["money_rtp_percent"] = self.total_win / self.total_bet * 100 if self.total_bet else 0.0
+            return {
+                "overall": overall,
+                "bet_levels": {level: self._scope_summary(scope) for level, scope in self.bet_levels.items()}
+            }
@@ -0,0 +1,76 @@
+"""
+In-memory per-player wallets for the game server.
+Balances are spread over lock shards so concurrent players rarely contend.
+"""
+
+import threading
+import zlib
+from typing import Dict, List
+
+class InsufficientBalance(Exception):
+    """Raised when a bet exceeds the player's balance."""
+
+class WalletStore:
+    """
+    Per-player balances guarded by sharded locks.
+    
+    A player's balance lives in the shard chosen by a hash of the player id,
+    and every operation holds only that shard's lock for a read-modify-write.
+    Players in different shards never wait on each other.
+    """
+    
+    def __init__(self, initial_balance: float = 1000, num_shards: int = 64):
+        self.initial_balance = initial_balance
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(num_shards)]
+        self._balances: List[Dict[str, float]] = [{} for _ in range(num_shards)]
+    
+    def _shard(self, player_id: str) -> int:
+        return zlib.crc32(player_id.encode()) % len(self._locks)
+    
+    def balance(self, player_id: str) -> float:
+        """Current balance; new players start with the initial balance."""
+        shard = self._shard(player_id)
+        with self._locks[shard]:
+            return self._balances[shard].get(player_id, self.initial_balance)
+    
+    def place_bet(self, player_id: str, amount: float) -> float:
+        """
+        Atomically check and debit a bet.
+        
+        Returns:
+            Balance after the debit
+        
+        Raises:
+            InsufficientBalance: If the balance is below the bet
+        """
+        shard = self._shard(player_id)
+        with self._locks[shard]:
+            balances = self._balances[shard]
+            current = balances.get(player_id, self.initial_balance)
+            if amount > current:
+                raise InsufficientBalance("Insufficient balance")
+            balances[player_id] = current - amount
+            return current - amount
+    
+    def place_bets(self, player_id: str, amount: float, max_count: int) -> int:
+        """
+        Atomically debit as many bets of `amount` as the balance covers, up to `max_count`.
+        
+        Returns:
+            Number of bets debited (0 when not even one is covered)
+        """
+        shard = self._shard(player_id)
+        with self._locks[shard]:
+            balances = self._balances[shard]
+            current = balances.get(player_id, self.initial_balance)
+            count = min(max_count, int(current // amount)) if amount > 0 else max_count
+            balances[player_id] = current - count * amount
+            return count
+    
+    def settle(self, player_id: str, amount: float) -> float:
+        """Atomically credit a win (or refund a bet) and return the new balance."""
+        shard = self._shard(player_id)
+        with self._locks[shard]:
+            balances = self._balances[shard]
+            balances[player_id] = balances.get(player_id, self.initial_balance) + amount
+            return balances[player_id]